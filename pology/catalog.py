@@ -7,13 +7,18 @@ Collection of PO entries.
 @license: GPLv3
 """
 
-import copy
 import difflib
+import mmap
 import os
 import re
 import tempfile
 import time
 import types
+from bisect import bisect_right
+from collections import defaultdict
+from enum import IntEnum
+from functools import lru_cache
+from sys import intern
 
 from pology import PologyError, _, n_
 from pology.header import Header, format_datetime
@@ -22,7 +27,7 @@ from pology.message import MessageUnsafe as MessageUnsafe
 from pology.escape import escape_c as escape
 from pology.escape import unescape_c as unescape
 from pology.fsops import mkdirpath
-from pology.monitored import Monitored
+from pology.monitored import Monitored, Monlist, Monpair
 from pology.resolve import expand_vars
 from pology.wrap import select_field_wrapper
 
@@ -38,67 +43,136 @@ class CatalogSyntaxError (PologyError):
     pass
 
 
+# Regex for the quoted part of a PO string line, from first to last quote.
+_quoted_rx = re.compile(r"\"(.*)\"", re.S)
+
+
 def _parse_quoted (s):
 
-    sp = s[s.index("\"") + 1:s.rindex("\"")]
-    sp = unescape(sp);
+    m = _quoted_rx.search(s)
+    sp = m.group(1) if m else ""
+    if "\\" in sp:
+        sp = unescape(sp)
     return sp
 
 
 class _MessageDict:
 
+    # Fields which are mostly empty, created only when first accessed.
+    _lazy_lists = frozenset((
+        "manual_comment", "auto_comment", "flag",
+        "msgctxt_previous", "msgid_previous", "msgid_plural_previous",
+        "msgctxt", "msgid_plural",
+        "_lines_manual_comment", "_lines_auto_comment",
+        "_lines_source", "_lines_flag",
+        "_lines_msgctxt_previous", "_lines_msgid_previous",
+        "_lines_msgid_plural_previous",
+        "_lines_msgctxt", "_lines_msgid_plural",
+    ))
+
     def __init__ (self, lcache=True):
 
-        self.manual_comment = []
-        self.auto_comment = []
         self.source = []
-        self.flag = []
         self.obsolete = False
-        self.msgctxt_previous = []
-        self.msgid_previous = []
-        self.msgid_plural_previous = []
-        self.msgctxt = []
         self.msgid = []
-        self.msgid_plural = []
         self.msgstr = []
         self.refline = -1
         self.refentry = -1
 
         if lcache:
             self._lines_all = []
-            self._lines_manual_comment = []
-            self._lines_auto_comment = []
-            self._lines_source = []
-            self._lines_flag = []
-            self._lines_msgctxt_previous = []
-            self._lines_msgid_previous = []
-            self._lines_msgid_plural_previous = []
-            self._lines_msgctxt = []
             self._lines_msgid = []
-            self._lines_msgid_plural = []
             self._lines_msgstr = []
 
 
-def _read_lines_and_encoding (file, filename):
+    def __getattr__ (self, att):
+
+        if att in self._lazy_lists:
+            lst = []
+            self.__dict__[att] = lst
+            return lst
+        raise AttributeError(att)
+
+
+class _LazyTail:
+
+    # Lines following the header in header-only mode.
+    # They are joined into text only when converted to string,
+    # as the tail is mostly just carried around until discarded.
+
+    def __init__ (self, lines, start):
+
+        self._lines = lines
+        self._start = start
+
+
+    def lines (self):
+
+        return self._lines[self._start:]
 
-    fstr = file.read()
-    # Determine line ending.
-    maxlno = 0
-    for clend in (b"\r\n", b"\n", b"\r"): # "\r\n" should be checked first
-        lno = len(fstr.split(clend))
-        if maxlno < lno:
-            maxlno = lno
-            lend = clend
-    lines = [x + b"\n" for x in fstr.split(lend)]
-    if lines[-1] == b"\n":
-        lines.pop()
 
+    def __str__ (self):
+
+        return "".join(self.lines())
+
+
+    def __bool__ (self):
+
+        return self._start < len(self._lines)
+
+
+# Regex for extracting the encoding from the header Content-Type field.
+_enc_rx = re.compile(rb"Content-Type:.*charset=(.+?)\\n", re.I)
+
+
+def _read_lines_and_encoding (file, filename, mapped=False):
+
+    # If requested, map the file into memory instead of reading it,
+    # so that raw data does not have to be held while decoding.
+    # Empty files and non-regular files cannot be mapped, so read those.
+    fmap = None
+    if mapped:
+        try:
+            fmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            pass
+    if fmap is None:
+        return _split_lines_and_encoding(file.read(), filename)
+    try:
+        return _split_lines_and_encoding(fmap, filename)
+    finally:
+        fmap.close()
+
+
+def _split_lines_and_encoding (fstr, filename):
+
+    # Determine line ending, as the one which splits the most lines.
+    if b"\r" not in fstr:
+        lend = b"\n" # the usual case, no need to count
+    else:
+        if not isinstance(fstr, bytes):
+            fstr = fstr[:] # for counting
+        maxlno = 0
+        for clend in (b"\r\n", b"\n", b"\r"): # "\r\n" should be checked first
+            lno = fstr.count(clend) + 1
+            if maxlno < lno:
+                maxlno = lno
+                lend = clend
+
+    # Look for encoding in lines before the first source reference,
+    # without splitting the whole file.
     enc = None
-    enc_rx = re.compile(rb"Content-Type:.*charset=(.+?)\\n", re.I)
-    for line in lines:
+    p = 0
+    lenf = len(fstr)
+    while p < lenf:
+        pe = fstr.find(lend, p)
+        if pe < 0:
+            pe = lenf
+        line = fstr[p:pe] + b"\n"
+        p = pe + len(lend)
         if line.strip().startswith(b"#:"):
             break
-        m = enc_rx.search(line)
+        m = _enc_rx.search(line)
         if m:
             enc = m.group(1).strip()
             if not enc or enc == b"CHARSET": # no encoding given
@@ -108,21 +182,62 @@ def _read_lines_and_encoding (file, filename):
         enc = b"UTF-8" # fall back to UTF-8 if encoding not found
     enc = enc.decode()
 
-    enclines = []
-    lno = 0
-    for line in lines:
-        lno += 1
-        try:
-            encline = line.decode(enc)
-        except UnicodeDecodeError as e:
-            raise CatalogSyntaxError(
-                _("@info",
-                  "Text decoding failure at %(file)s:%(line)d:%(col)d "
-                  "under assumed encoding '%(enc)s'.",
-                  file=filename, line=lno, col=e.start, enc=enc))
-        enclines.append(encline)
+    # Decode the whole file at once, and only then split it into lines.
+    try:
+        text = str(fstr, enc)
+    except UnicodeDecodeError as e:
+        lno = fstr[:e.start].count(lend) + 1
+        lpos = fstr.rfind(lend, 0, e.start)
+        col = e.start - (lpos + len(lend) if lpos >= 0 else 0)
+        raise CatalogSyntaxError(
+            _("@info",
+              "Text decoding failure at %(file)s:%(line)d:%(col)d "
+              "under assumed encoding '%(enc)s'.",
+              file=filename, line=lno, col=col, enc=enc))
+    lines = [x + "\n" for x in text.split(lend.decode())]
+    if lines[-1] == "\n":
+        lines.pop()
 
-    return enclines, enc
+    return lines, enc
+
+
+# Parsing contexts of PO lines: life, age, and field of the message.
+# Members are singletons, so contexts are compared by identity.
+class _Ctx (IntEnum):
+    MODERN = 0
+    OBSOLETE = 1
+    PREVIOUS = 2
+    CURRENT = 3
+    NONE = 4
+    MSGCTXT = 5
+    MSGID = 6
+    MSGID_PLURAL = 7
+    MSGSTR = 8
+
+# All contexts in order, for unpacking into parser locals.
+_ctx_all = tuple(_Ctx)
+
+
+# Comment kinds by the first two characters of a PO comment line.
+# Anything not listed is a manual comment.
+_ck_manual, _ck_obsolete, _ck_previous, _ck_source, _ck_flag, _ck_auto = \
+    list(range(6))
+_comment_kinds = {
+    "#~": _ck_obsolete,
+    "#|": _ck_previous,
+    "#:": _ck_source,
+    "#,": _ck_flag,
+    "#.": _ck_auto,
+}
+
+# Fields with single strings, collected from lines while parsing.
+_joined_fields = (
+    "msgctxt_previous", "msgid_previous", "msgid_plural_previous",
+    "msgctxt", "msgid", "msgid_plural",
+)
+
+# Regex for the field keyword starting a PO line.
+_field_keyword_rx = re.compile(r"msg(?:ctxt|id_plural|id|str)")
 
 
 def _parse_po_file (file, MessageType=MessageMonitored,
@@ -140,13 +255,13 @@ def _parse_po_file (file, MessageType=MessageMonitored,
                          "of data being read or written",
                          "&lt;stream&gt;").resolve("none")
         close_later = False
-    lines, fenc = _read_lines_and_encoding(file, filename)
+    lines, fenc = _read_lines_and_encoding(file, filename, close_later)
     if close_later:
         file.close()
 
     ctx_modern, ctx_obsolete, \
     ctx_previous, ctx_current, \
-    ctx_none, ctx_msgctxt, ctx_msgid, ctx_msgid_plural, ctx_msgstr = list(range(9))
+    ctx_none, ctx_msgctxt, ctx_msgid, ctx_msgid_plural, ctx_msgstr = _ctx_all
 
     messages1 = list()
     lno = 0
@@ -160,16 +275,47 @@ def _parse_po_file (file, MessageType=MessageMonitored,
     loc.life_context = ctx_modern
     loc.field_context = ctx_none
     loc.age_context = ctx_current
+    loc.cur_lines = None
+    loc.cur_age = None
+
+    # Line cache of the current field and age context, selected on the first
+    # field line after the context changes; cur_lines is reset to None
+    # whenever the field context changes.
+    cur_lines_attrs = {
+        (ctx_current, ctx_msgctxt): "_lines_msgctxt",
+        (ctx_current, ctx_msgid): "_lines_msgid",
+        (ctx_current, ctx_msgid_plural): "_lines_msgid_plural",
+        (ctx_current, ctx_msgstr): "_lines_msgstr",
+        (ctx_previous, ctx_msgctxt): "_lines_msgctxt_previous",
+        (ctx_previous, ctx_msgid): "_lines_msgid_previous",
+        (ctx_previous, ctx_msgid_plural): "_lines_msgid_plural_previous",
+    }
+    def select_cur_lines ():
+        attr = cur_lines_attrs.get((loc.age_context, loc.field_context))
+        if attr is None:
+            if loc.age_context is ctx_previous:
+                iid = 11
+            elif loc.age_context is ctx_current:
+                iid = 12
+            else:
+                iid = 10
+            raise PologyError(
+                _("@info",
+                  "Internal problem (%(id)d) at %(file)s:%(line)d.",
+                  id=iid, file=filename, line=loc.lno))
+        loc.cur_lines = getattr(loc.msg, attr)
+        loc.cur_age = loc.age_context
 
     # The message has been completed by the previous line if the context just
     # switched away from ctx_msgstr;
     # call whenever context switch happens, *before* assigning new context.
     nlines = len(lines)
     def try_finish ():
-        if loc.field_context == ctx_msgstr:
+        if loc.field_context is ctx_msgstr:
             messages1.append(loc.msg)
             loc.msg = _MessageDict(lcache)
             loc.field_context = ctx_none
+            loc.cur_lines = None
             # In header-only mode, the first message read is the header.
             # Compose the tail of this and rest of the lines, and
             # set lno to nlines for exit.
@@ -177,13 +323,13 @@ def _parse_po_file (file, MessageType=MessageMonitored,
                 # If not at end of file, current line is part of
                 # first message and should be retained in the tail.
                 offset = loc.lno < nlines and 1 or 0
-                loc.tail = "".join(lines[loc.lno - offset:])
+                loc.tail = _LazyTail(lines, loc.lno - offset)
                 loc.lno = nlines
 
-    while loc.lno < nlines: # sentry for last entry
-        line_raw = lines[lno]
-        loc.lno += 1
-        lno = loc.lno # shortcut
+    for lno, line_raw in enumerate(lines, 1):
+        if loc.lno >= nlines: # header-only mode finished early
+            break
+        loc.lno = lno
         line = line_raw.strip()
         if not line:
             continue
@@ -192,26 +338,30 @@ def _parse_po_file (file, MessageType=MessageMonitored,
         loc.life_context = ctx_modern
         loc.age_context = ctx_current
 
-        if line.startswith("#"):
+        # Classify by the first character, so that the dominant string
+        # continuation lines skip field keyword matching altogether.
+        if line[0] == "#":
+            comment_kind = _comment_kinds.get(line[:2], _ck_manual)
+            cbody = line[2:]
 
             if 0: pass
 
-            elif line.startswith("#~|"):
-                line = line[3:].lstrip()
-                loc.age_context = ctx_previous
-
-            elif line.startswith("#~"):
-                line = line[2:].lstrip()
-                loc.life_context = ctx_obsolete
+            elif comment_kind == _ck_obsolete:
+                if cbody.startswith("|"):
+                    line = cbody[1:].lstrip()
+                    loc.age_context = ctx_previous
+                else:
+                    line = cbody.lstrip()
+                    loc.life_context = ctx_obsolete
 
-            elif line.startswith("#|"):
-                line = line[2:].lstrip()
+            elif comment_kind == _ck_previous:
+                line = cbody.lstrip()
                 loc.age_context = ctx_previous
 
-            elif line.startswith("#:"):
+            elif comment_kind == _ck_source:
                 try_finish()
                 string_follows = False
-                for srcref in line[2:].split(" "):
+                for srcref in cbody.split(" "):
                     srcref = srcref.strip()
                     if srcref:
                         lst = srcref.split(":", 1)
@@ -227,62 +377,61 @@ def _parse_po_file (file, MessageType=MessageMonitored,
                         else:
                             loc.msg.source.append((srcref, -1))
 
-            elif line.startswith("#,"):
+            elif comment_kind == _ck_flag:
                 try_finish()
                 string_follows = False
-                for flag in line[2:].split(","):
+                for flag in cbody.split(","):
                     flag = flag.strip()
                     if flag:
                         loc.msg.flag.append(flag)
 
-            elif line.startswith("#."):
+            elif comment_kind == _ck_auto:
                 try_finish()
                 string_follows = False
-                loc.msg.auto_comment.append(line[2:].lstrip())
+                loc.msg.auto_comment.append(cbody.lstrip())
 
-            elif line.startswith("#"):
+            else:
+                # All unknown comments treated as manual.
                 try_finish()
                 string_follows = False
-                loc.msg.manual_comment.append(line[2:].lstrip())
+                loc.msg.manual_comment.append(cbody.lstrip())
 
-            else:
-                # Cannot reach, all unknown comments treated as manual above.
-                raise CatalogSyntaxError(
-                    _("@info",
-                      "Unknown comment type at %(file)s:%(line)d.",
-                      file=filename, line=lno))
+        if line and string_follows and line[0] != "\"": # for starting fields
+            m = _field_keyword_rx.match(line)
+            fkeyw = m.group() if m else None
+            if fkeyw is not None:
+                line = line[m.end():].lstrip()
 
-        if line and string_follows: # for starting fields
             if 0: pass
 
-            elif line.startswith("msgctxt"):
+            elif fkeyw == "msgctxt":
                 # TODO: Assert context.
                 try_finish()
                 loc.field_context = ctx_msgctxt
-                line = line[7:].lstrip()
+                loc.cur_lines = None
 
-            elif line.startswith("msgid_plural"):
+            elif fkeyw == "msgid_plural":
                 # TODO: Assert context.
                 # No need for try_finish(), msgid_plural cannot start message.
                 loc.field_context = ctx_msgid_plural
-                line = line[12:].lstrip()
+                loc.cur_lines = None
 
-            elif line.startswith("msgid"):
+            elif fkeyw == "msgid":
                 # TODO: Assert context.
                 try_finish()
-                if loc.life_context == ctx_obsolete:
+                if loc.life_context is ctx_obsolete:
                     loc.msg.obsolete = True
                 loc.field_context = ctx_msgid
-                if loc.age_context == ctx_current:
+                loc.cur_lines = None
+                if loc.age_context is ctx_current:
                     loc.msg.refline = lno
                     loc.msg.refentry = eno
                     eno += 1
-                line = line[5:].lstrip()
 
-            elif line.startswith("msgstr"):
+            elif fkeyw == "msgstr":
                 # TODO: Assert context.
                 loc.field_context = ctx_msgstr
-                line = line[6:].lstrip()
+                loc.cur_lines = None
                 msgstr_i = 0
                 if line.startswith("["):
                     line = line[1:].lstrip()
@@ -310,30 +459,30 @@ def _parse_po_file (file, MessageType=MessageMonitored,
                 for i in range(len(loc.msg.msgstr), msgstr_i + 1):
                     loc.msg.msgstr.append([])
 
-            elif not line.startswith("\""):
+            else:
                 raise CatalogSyntaxError(
                     _("@info",
                       "Unknown field name at %(file)s:%(line)d.",
                       file=filename, line=lno))
 
         if line and string_follows: # for continuing fields
-            if line.startswith("\""):
+            if line[0] == "\"":
                 s = _parse_quoted(line)
-                if loc.age_context == ctx_previous:
-                    if loc.field_context == ctx_msgctxt:
+                if loc.age_context is ctx_previous:
+                    if loc.field_context is ctx_msgctxt:
                         loc.msg.msgctxt_previous.append(s)
-                    elif loc.field_context == ctx_msgid:
+                    elif loc.field_context is ctx_msgid:
                         loc.msg.msgid_previous.append(s)
-                    elif loc.field_context == ctx_msgid_plural:
+                    elif loc.field_context is ctx_msgid_plural:
                         loc.msg.msgid_plural_previous.append(s)
                 else:
-                    if loc.field_context == ctx_msgctxt:
+                    if loc.field_context is ctx_msgctxt:
                         loc.msg.msgctxt.append(s)
-                    elif loc.field_context == ctx_msgid:
+                    elif loc.field_context is ctx_msgid:
                         loc.msg.msgid.append(s)
-                    elif loc.field_context == ctx_msgid_plural:
+                    elif loc.field_context is ctx_msgid_plural:
                         loc.msg.msgid_plural.append(s)
-                    elif loc.field_context == ctx_msgstr:
+                    elif loc.field_context is ctx_msgstr:
                         loc.msg.msgstr[msgstr_i].append(s)
             else:
                 raise CatalogSyntaxError(
@@ -344,46 +493,23 @@ def _parse_po_file (file, MessageType=MessageMonitored,
         # Update line caches.
         if lcache:
             loc.msg._lines_all.append(line_raw)
-            if 0: pass
-            elif line_raw.startswith("#:"):
+            if line_raw.startswith("#"):
+                comment_kind = _comment_kinds.get(line_raw[:2], _ck_manual)
+            else:
+                comment_kind = None
+            if comment_kind is None or comment_kind == _ck_obsolete \
+            or comment_kind == _ck_previous:
+                if loc.cur_lines is None or loc.cur_age is not loc.age_context:
+                    select_cur_lines()
+                loc.cur_lines.append(line_raw)
+            elif comment_kind == _ck_source:
                 loc.msg._lines_source.append(line_raw)
-            elif line_raw.startswith("#,"):
+            elif comment_kind == _ck_flag:
                 loc.msg._lines_flag.append(line_raw)
-            elif line_raw.startswith("#."):
+            elif comment_kind == _ck_auto:
                 loc.msg._lines_auto_comment.append(line_raw)
-            elif line_raw.startswith("#") and line_raw[1:2] not in ("~", "|"):
-                loc.msg._lines_manual_comment.append(line_raw)
-            elif loc.age_context == ctx_previous:
-                if loc.field_context == ctx_msgctxt:
-                    loc.msg._lines_msgctxt_previous.append(line_raw)
-                elif loc.field_context == ctx_msgid:
-                    loc.msg._lines_msgid_previous.append(line_raw)
-                elif loc.field_context == ctx_msgid_plural:
-                    loc.msg._lines_msgid_plural_previous.append(line_raw)
-                else:
-                    raise PologyError(
-                        _("@info",
-                          "Internal problem (%(id)d) at %(file)s:%(line)d.",
-                          id=11, file=filename, line=lno))
-            elif loc.age_context == ctx_current:
-                if loc.field_context == ctx_msgctxt:
-                    loc.msg._lines_msgctxt.append(line_raw)
-                elif loc.field_context == ctx_msgid:
-                    loc.msg._lines_msgid.append(line_raw)
-                elif loc.field_context == ctx_msgid_plural:
-                    loc.msg._lines_msgid_plural.append(line_raw)
-                elif loc.field_context == ctx_msgstr:
-                    loc.msg._lines_msgstr.append(line_raw)
-                else:
-                    raise PologyError(
-                        _("@info",
-                          "Internal problem (%(id)d) at %(file)s:%(line)d.",
-                          id=12, file=filename, line=lno))
             else:
-                raise PologyError(
-                    _("@info",
-                      "Internal problem (%(id)d) at %(file)s:%(line)d.",
-                      id=10, file=filename, line=lno))
+                loc.msg._lines_manual_comment.append(line_raw)
 
     try_finish() # the last message
 
@@ -394,38 +520,42 @@ def _parse_po_file (file, MessageType=MessageMonitored,
               file=filename, line=lno))
 
     # Join fields.
-    join_or_none = lambda x: "".join(x) if x else None
+    # Work on raw dictionaries directly, where lazily created fields
+    # may be missing (and become None, same as when empty).
     for i, msg in enumerate(messages1):
-        msg.msgctxt_previous = join_or_none(msg.msgctxt_previous)
-        msg.msgid_previous = join_or_none(msg.msgid_previous)
-        msg.msgid_plural_previous = join_or_none(msg.msgid_plural_previous)
-        msg.msgctxt = join_or_none(msg.msgctxt)
-        msg.msgid = join_or_none(msg.msgid)
-        msg.msgid_plural = join_or_none(msg.msgid_plural)
-        msg.msgstr = [join_or_none(x) for x in msg.msgstr]
-        if i > 0 and msg.msgid == "" and msg.msgctxt is None:
+        d = msg.__dict__
+        for att in _joined_fields:
+            x = d.get(att)
+            d[att] = "".join(x) if x else None
+        d["msgstr"] = ["".join(x) if x else None for x in d["msgstr"]]
+        # Intern key fields, as keys are hashed and compared a lot later.
+        for att in ("msgctxt", "msgid"):
+            x = d[att]
+            if x:
+                d[att] = intern(x)
+        if i > 0 and d["msgid"] == "" and d["msgctxt"] is None:
             raise CatalogSyntaxError(
                 _("@info",
                   "Empty message at %(file)s:%(line)d.",
                   file=filename, line=msg.refline))
 
     # Repack raw dictionaries as message objects.
-    messages2 = []
-    for msg1 in messages1:
-        messages2.append(MessageType(msg1.__dict__))
+    # Non-monitored messages can take over raw dictionaries as they are.
+    if MessageType is MessageUnsafe:
+        messages2 = [MessageUnsafe._adopt(x.__dict__) for x in messages1]
+    else:
+        messages2 = [MessageType(x.__dict__) for x in messages1]
 
     return (messages2, fenc, loc.tail)
 
 
 def _srcref_repack (srcrefs):
-    srcdict = {}
+    srcdict = defaultdict(list)
     for file, line in srcrefs:
-        if not file in srcdict:
-            srcdict[file] = [line]
-        else:
-            srcdict[file].append(line)
-    srcdict[file].sort()
-    return srcdict
+        srcdict[file].append(line)
+    for lines in srcdict.values():
+        lines.sort()
+    return dict(srcdict)
 
 
 _Catalog_spec = {
@@ -436,6 +566,73 @@ _Catalog_spec = {
     "*" : {}, # messages sequence: the type is assigned at construction
 }
 
+def _Catalog_spec_with_mtype (mtype):
+    spec = dict(_Catalog_spec)
+    spec["*"] = dict(spec["*"], type=mtype)
+    return spec
+
+# Final specs by message type, shared by all catalogs (specs are read-only).
+_Catalog_spec_final = {
+    MessageMonitored : _Catalog_spec_with_mtype(MessageMonitored),
+    MessageUnsafe : _Catalog_spec_with_mtype(MessageUnsafe),
+}
+
+
+# Plural evaluation functions by raw plural definitions,
+# shared between catalogs as many have the same definition.
+_plural_functions = {}
+
+def _plural_function (plustr):
+
+    plfunc = _plural_functions.get(plustr)
+    if plfunc is not None:
+        return plfunc
+    rawplustr = plustr
+
+    # Prepare Python-evaluable string out of the raw definition.
+    plustr = plustr[plustr.find("=") + 1:] # remove plural= part
+    p = -1
+    evalstr = ""
+    while 1:
+        p = plustr.find("?")
+        if p < 0:
+            evalstr += " " + plustr
+            break
+        cond = plustr[:p]
+        plustr = plustr[p + 1:]
+        cond = cond.replace("&&", " and ")
+        cond = cond.replace("||", " or ")
+        evalstr += "(" + cond + ") and "
+        p = plustr.find(":")
+        body = plustr[:p]
+        plustr = plustr[p + 1:]
+        evalstr += "\"" + body + "\" or "
+    if not evalstr.strip():
+        evalstr = "0"
+
+    # Wrap into a function of n (the variable in plural definitions).
+    plfunc = eval("lambda n: " + evalstr.strip(), {"__builtins__": {}})
+    _plural_functions[rawplustr] = plfunc
+    return plfunc
+
+
+# Patterns for parsing the Plural-Forms header field.
+_nplurals_rx = re.compile(r"\d+")
+_plural_single_rx = re.compile(r"\bn\s*==\s*\d+\s*\)?\s*\?\s*(\d+)")
+_plural_ineq_rx = re.compile(r"\bn\s*(!=|>|<)\s*\d+\s*([^?]|$)")
+
+
+# Regular expressions for message selection by user-supplied patterns,
+# which are often the same over many selections.
+@lru_cache(maxsize=256)
+def _compile_rx (pattern, flags):
+
+    return re.compile(pattern, flags)
+
+
+# Years listed in translator's line among header comments.
+_author_years_rx = re.compile(r"\b(\d{2,4})\s*[,.]")
+
 
 class Catalog (Monitored):
     """
@@ -590,51 +787,75 @@ class Catalog (Monitored):
 
         self._filename = filename
 
+        # Cached name, derived from the file name it was computed for.
+        self._name = None
+        self._name_filename = None
+
         self._messages = self.__dict__["*"] # nicer name for the sequence
 
         # Fill in the message key-position links.
+        self._rebuild_msgpos()
+
         # Set committed and remove-on-sync status.
-        self._msgpos = {}
-        for i in range(len(self._messages)):
-            self._msgpos[self._messages[i].key] = i
-            self._messages[i]._committed = True
-            self._messages[i]._remove_on_sync = False
+        # Underscored attributes end up in the instance dictionary anyway,
+        # so set them there directly to bypass message attribute setters.
+        for msg in self._messages:
+            mdict = msg.__dict__
+            mdict["_committed"] = True
+            mdict["_remove_on_sync"] = False
 
         # Initialize monitoring.
-        final_spec = copy.deepcopy(_Catalog_spec)
-        final_spec["*"]["type"] = message_type
-        self.assert_spec_init(final_spec)
+        self.assert_spec_init(_Catalog_spec_final[message_type])
 
         # Inverse map (by msgstr) will be computed on first use.
         self._invmap = None
 
-        # Cached plural definition from the header.
-        self._plustr = ""
+        # Index of messages by msgid will be computed on first use.
+        self._msgid_index = None
+
+        # Index of source references for automatic insertion,
+        # and position of first obsolete message,
+        # computed on first use within a single addition.
+        self._srcidx = None
+        self._obspos_ins = None
+
+        # Cached plural definition from the header,
+        # and its evaluation function.
+        self._plural_header_cache_key = None
+        self._plural_cache = {}
+
+        # Values determined from the header are cached along with
+        # the header revision at which they were determined;
+        # revision -1 means not yet determined, and None that the value
+        # was set explicitly and the header is no longer consulted.
+
+        # Header fields by name, for the header revision.
+        self._header_snap = None
 
         # Cached language of the translation.
         # None means the language has not been determined.
         self._lang = None
-        self._lang_determined = False
+        self._lang_rev = -1
 
         # Cached environments.
         self._envs = None
-        self._envs_determined = False
+        self._envs_rev = -1
 
         # Cached accelerator markers.
         self._accels = None
-        self._accels_determined = False
+        self._accels_rev = -1
 
         # Cached markup types.
         self._mtypes = None
-        self._mtypes_determined = False
+        self._mtypes_rev = -1
 
         # Cached wrapping policy.
         if wrapping is None:
-            self._wrap_determined = False
+            self._wrap_rev = -1
             self._wrapf = None
             self._wrapkw = None
         else:
-            self._wrap_determined = True
+            self._wrap_rev = None
             self._wrapf = select_field_wrapper(wrapping)
             self._wrapkw = tuple(wrapping)
 
@@ -659,12 +880,17 @@ class Catalog (Monitored):
         if 0: pass
 
         elif att == "name":
-            basename = os.path.basename(self._filename)
-            p = basename.rfind(".")
-            if p >= 0:
-                return basename[:p]
-            else:
-                return basename
+            # Recompute only if the file name has been changed meanwhile.
+            filename = self._filename
+            if self._name_filename is not filename:
+                basename = os.path.basename(filename)
+                p = basename.rfind(".")
+                if p >= 0:
+                    self._name = basename[:p]
+                else:
+                    self._name = basename
+                self._name_filename = filename
+            return self._name
 
         else:
             return Monitored.__getattr__(self, att)
@@ -703,7 +929,7 @@ class Catalog (Monitored):
         self._assert_headonly()
         self.assert_spec_getitem()
         if not isinstance(ident, int):
-            ident = self._msgpos[ident.key]
+            ident = self._keypos(ident.key)
         return self._messages[ident]
 
 
@@ -726,8 +952,11 @@ class Catalog (Monitored):
         self._assert_headonly()
         self.assert_spec_setitem(msg)
         if not isinstance(ident, int):
-            ident = self._msgpos[ident.key]
+            ident = self._keypos(ident.key)
+        self._invmap_remove(self._messages[ident])
         self._messages[ident] = msg
+        self._invmap_add(msg)
+        self._msgid_index = None
         if self._messages[ident] is not msg:
             self.__dict__["#"]["*"] += 1
         return self._messages[ident]
@@ -768,10 +997,11 @@ class Catalog (Monitored):
             return False
         if self.header != ocat.header:
             return False
-        for i in range(len(ocat)):
-            if self[i] != ocat[i]:
-                return False
-        return True
+        if self._messages is ocat._messages:
+            return True
+        # Length check above already asserted non-header-only mode.
+        return not any(msg != omsg for msg, omsg
+                       in zip(self._messages, ocat._messages))
 
 
     def __ne__ (self, ocat):
@@ -805,7 +1035,7 @@ class Catalog (Monitored):
         self._assert_headonly()
         if msg.key in self._msgpos:
             if wobs or not msg.obsolete:
-                return self._msgpos[msg.key]
+                return self._keypos(msg.key)
         return -1
 
 
@@ -917,6 +1147,17 @@ class Catalog (Monitored):
                     _("@info",
                       "Trying to insert message with empty key into catalog."))
 
+        # Existing messages may have been modified since last addition,
+        # so the source index must be computed anew.
+        self._srcidx = None
+        self._obspos_ins = None
+        self._msgid_index = None
+
+        # Single message, as when called by add(), needs no batch handling.
+        if len(msgpos) == 1:
+            msg, pos = msgpos[0]
+            return [self._add_single(msg, pos, srefsyn)]
+
         # Resolve backward positions, set aside automatic positions,
         # set aside replacements.
         msgpos_ins = []
@@ -951,6 +1192,7 @@ class Catalog (Monitored):
                     break
                 elif cumulative:
                     pos += 1
+                i += 1
             msgpos_ins.insert(i, (msg, pos))
 
         # Accumulate insertion positions if not cumulative.
@@ -962,45 +1204,93 @@ class Catalog (Monitored):
                 off += 1
             msgpos_ins = msgpos_tmp
 
-        # Update key-position links for the index to be added.
-        off = 0
-        for i in range(len(msgpos_ins)):
-            pos1 = msgpos_ins[i][1] - off
-            if i + 1 < len(msgpos_ins):
-                pos2 = msgpos_ins[i + 1][1] - (off + 1)
-            else:
-                pos2 = len(self._messages)
-            for j in range(pos1, pos2):
-                ckey = self._messages[j].key
-                self._msgpos[ckey] = j + (off + 1)
-            off += 1
+        # Key-position links of messages shifted by insertion are not
+        # updated here, but marked stale from the first insertion onwards
+        # and relinked when next needed.
+        if msgpos_ins and msgpos_ins[0][1] < len(self._messages):
+            self._mark_msgpos_stale(msgpos_ins[0][1])
 
         # Insert messages at computed positions.
+        # When positions are strictly increasing, as they normally are,
+        # merge new messages with existing into a new sequence in one pass,
+        # rather than inserting one by one.
+        messages = self._messages
+        if all(p1 < p2 for (m1, p1), (m2, p2)
+                        in zip(msgpos_ins, msgpos_ins[1:])):
+            merged = []
+            src = 0
+            for msg, pos in msgpos_ins:
+                take = pos - len(merged)
+                merged.extend(messages[src:src + take])
+                src += take
+                merged.append(msg)
+            merged.extend(messages[src:])
+            messages[:] = merged
+        else:
+            # Messages inserted at the same position shift earlier ones,
+            # so their links are stale too.
+            self._mark_msgpos_stale(msgpos_ins[0][1])
+            for msg, pos in msgpos_ins:
+                messages.insert(pos, msg)
+        # Record insertion positions by message identity,
+        # to avoid hashing messages by content.
+        ins_by_id = {}
         for msg, pos in msgpos_ins:
-            self._messages.insert(pos, msg)
-            self._messages[pos]._remove_on_sync = False # no pending removal
-            self._messages[pos]._committed = False # write it on sync
+            msg._remove_on_sync = False # no pending removal
+            msg._committed = False # write it on sync
             self._msgpos[msg.key] = pos # store new key-position link
             self.__dict__["#"]["*"] += 1 # indicate sequence change
+            self._invmap_add(msg)
+            ins_by_id[id(msg)] = pos
 
         # Replace existing messages.
         for msg in msgs_repl:
-            pos = self._msgpos[msg.key]
+            pos = self._keypos(msg.key)
+            self._invmap_remove(self._messages[pos])
             self._messages[pos] = msg
+            self._invmap_add(msg)
 
         # Recover insertion/replacement positions.
-        pos_res = []
-        msgpos_ins_d = dict(msgpos_ins)
-        for msg, pos in msgpos:
-            ipos = msgpos_ins_d.get(msg)
-            if ipos is not None:
-                pos_res.append(ipos)
-            else:
-                pos_res.append(None)
+        pos_res = [ins_by_id.get(id(msg)) for msg, pos in msgpos]
 
         return pos_res
 
 
+    def _add_single (self, msg, pos, srefsyn):
+
+        # Add a single message, already checked for validity.
+        # Return insertion position, or None if replaced.
+
+        if msg.key in self._msgpos:
+            pos = self._keypos(msg.key)
+            self._invmap_remove(self._messages[pos])
+            self._messages[pos] = msg
+            self._invmap_add(msg)
+            return None
+
+        if pos is not None:
+            if pos < 0:
+                pos = len(self._messages) + pos
+            if pos < 0 or pos > len(self._messages):
+                raise PologyError(
+                    _("@info",
+                      "Trying to insert message into catalog by "
+                      "position out of range."))
+        else:
+            pos, d1 = self._pick_insertion_point(msg, srefsyn)
+
+        if pos < len(self._messages):
+            self._mark_msgpos_stale(pos)
+        self._messages.insert(pos, msg)
+        msg._remove_on_sync = False # no pending removal
+        msg._committed = False # write it on sync
+        self._msgpos[msg.key] = pos # store new key-position link
+        self.__dict__["#"]["*"] += 1 # indicate sequence change
+        self._invmap_add(msg)
+
+        return pos
+
+
     def obspos (self):
         """
         Get canonical position of the first obsolete message.
@@ -1055,7 +1345,9 @@ class Catalog (Monitored):
         If the position is out of range, or the lookup message does not have
         a counterpart in this catalog with the same key, an error is signaled.
 
-        Runtime complexity O(n), regardless of C{ident} type.
+        Runtime complexity O(n), regardless of C{ident} type,
+        though the positions of the following messages are relinked
+        only on next lookup by key, once for any number of removals.
         Use L{remove_on_sync()<remove_on_sync>} method for O(1) complexity,
         when the logic allows the removal to be delayed to syncing time.
 
@@ -1073,18 +1365,19 @@ class Catalog (Monitored):
             key = self._messages[ip].key
         else:
             key = ident.key
-            ip = self._msgpos[key]
-
-        # Update key-position links for the removed index.
-        for i in range(ip + 1, len(self._messages)):
-            ckey = self._messages[i].key
-            self._msgpos[ckey] = i - 1
+            ip = self._keypos(key)
 
         # Remove from messages and key-position links.
-        self._messages.pop(ip)
+        self._invmap_remove(self._messages.pop(ip))
         self._msgpos.pop(key)
+        self._msgid_index = None
         self.__dict__["#"]["*"] += 1 # indicate sequence change
 
+        # Key-position links of messages shifted by removal are not
+        # updated here, but marked stale and relinked when next needed.
+        if ip < len(self._messages):
+            self._mark_msgpos_stale(ip)
+
 
     def remove_on_sync (self, ident):
         """
@@ -1111,7 +1404,7 @@ class Catalog (Monitored):
         if isinstance(ident, int):
             ip = ident
         else:
-            ip = self._msgpos[ident.key]
+            ip = self._keypos(ident.key)
 
         # Indicate removal on sync for this message.
         self._messages[ip]._remove_on_sync = True
@@ -1184,62 +1477,53 @@ class Catalog (Monitored):
         # No need to indicate sequence changes here, as after sync the
         # catalog is set to unmodified throughout.
 
-        # Temporarily insert header, for homogeneous iteration.
-        self._messages.insert(0, self._header)
-        self._messages[0]._remove_on_sync = False # never remove header
-        nmsgs = len(self._messages)
-
-        # Starting position for reinserting obsolete messages.
-        obstop = len(self._messages)
-        while obstop > 0 and self._messages[obstop - 1].obsolete:
-            obstop -= 1
-        obsins = obstop
-
         # NOTE: Key-position links may be invalidated from this point onwards,
         # by reorderings/removals. To make sure it is not used before the
         # rebuild at the end, delete now.
         del self._msgpos
 
-        if not self._wrap_determined:
-            self.wrapping()
+        self.wrapping()
 
+        # Header comes first, and is never removed or reordered.
         flines = []
-        i = 0
-        while i < nmsgs:
-            msg = self._messages[i]
+        committed = self._header.get("_committed", False)
+        flines.extend(self._header.to_lines(self._wrapf,
+                                            force or not committed))
+        # Header should finish with one empty line.
+        if flines[-1] != "\n":
+            flines.append("\n")
+
+        messages = self._messages
+        if not noobsend:
+            # Move obsolete messages out of order to the end, in one pass,
+            # such that the relative ordering of obsolete messages
+            # is preserved.
+            obstop = self.obspos()
+            head = messages[:obstop]
+            if any(msg.obsolete for msg in head):
+                messages[:] = ([msg for msg in head if not msg.obsolete]
+                               + [msg for msg in head if msg.obsolete]
+                               + messages[obstop:])
+
+        for msg in messages:
             if msg.get("_remove_on_sync", False):
                 # Removal on sync requested, just skip.
-                i += 1
-            elif not noobsend and msg.obsolete and i < obstop:
-                # Obsolete message out of order, reinsert and repeat the index.
-                # Reinsertion is such that the relative ordering of obsolete
-                # messages is preserved.
-                msg = self._messages.pop(i)
-                self._messages.insert(obsins - 1, msg) # -1 due to popping
-                obstop -= 1
-            else:
-                # Normal message, append formatted lines to rest.
-                committed = msg.get("_committed", False)
-                flines.extend(msg.to_lines(self._wrapf,
-                                           force or not committed))
-                # Message should finish with one empty line.
-                if flines[-1] != "\n":
-                    flines.append("\n")
-                i += 1
+                continue
+            # Normal message, append formatted lines to rest.
+            committed = msg.get("_committed", False)
+            flines.extend(msg.to_lines(self._wrapf, force or not committed))
+            # Message should finish with one empty line.
+            if flines[-1] != "\n":
+                flines.append("\n")
         if not self._tail:
             # Remove trailing empty lines.
             while flines and flines[-1] == "\n":
                 flines.pop(-1)
         else:
-            # Tail has to be converted to separate lines,
+            # Tail is added as separate lines,
             # so that possibly new encoding is applied to it too
             # while being able to report line/column on error.
-            flines.extend(x + "\n" for x in self._tail.split("\n"))
-            if self._tail.endswith("\n"):
-                flines.pop(-1)
-
-        # Remove temporarily inserted header.
-        self._messages.pop(0)
+            flines.extend(self._tail.lines())
 
         # Update message map.
         self.sync_map()
@@ -1247,19 +1531,19 @@ class Catalog (Monitored):
         # Reset modification state throughout.
         self.modcount = 0
 
-        # Encode lines and write file.
-        enclines = []
-        for i, line in enumerate(flines):
-            try:
-                encline = line.encode(self._encoding)
-            except UnicodeEncodeError as e:
-                raise CatalogSyntaxError(
-                    _("@info",
-                      "Text encoding failure at %(file)s:%(line)d:%(col)d "
-                      "under assumed encoding '%(enc)s'.",
-                      file=self._filename, line=(i + 1), col=e[2],
-                      enc=self._encoding))
-            enclines.append(encline)
+        # Encode text and write file.
+        text = "".join(flines)
+        try:
+            enctext = text.encode(self._encoding)
+        except UnicodeEncodeError as e:
+            lno = text.count("\n", 0, e.start) + 1
+            col = e.start - (text.rfind("\n", 0, e.start) + 1)
+            raise CatalogSyntaxError(
+                _("@info",
+                  "Text encoding failure at %(file)s:%(line)d:%(col)d "
+                  "under assumed encoding '%(enc)s'.",
+                  file=self._filename, line=lno, col=col,
+                  enc=self._encoding))
         if not writefh:
             # Create the parent directory if it does not exist.
             pdirpath = os.path.dirname(self._filename)
@@ -1271,20 +1555,14 @@ class Catalog (Monitored):
             # ...needs Python 2.6
             tmpfname = os.path.join(pdirpath,
                                     os.path.basename(self._filename) + "~tmpw")
-            ofl = open(tmpfname, "wb")
+            ofl = open(tmpfname, "wb", buffering=(1 << 20))
         else:
             ofl = writefh
-        ofl.writelines(enclines)
+        ofl.write(enctext)
         if not writefh:
             ofl.close()
-            if os.name == "nt" and os.path.exists(self._filename):
-                # NT does not allow to overwrite on rename.
-                tmpfname2 = self._filename + "~tmpo"
-                os.rename(self._filename, tmpfname2)
-                os.rename(tmpfname, self._filename)
-                os.remove(tmpfname2)
-            else:
-                os.rename(tmpfname, self._filename)
+            # Replacing overwrites the destination on all platforms.
+            os.replace(tmpfname, self._filename)
 
         # Indicate the catalog is no longer created from scratch, if it was.
         self._created_from_scratch = False
@@ -1320,23 +1598,22 @@ class Catalog (Monitored):
         # Separate messages into current and obsolete.
         newlst = []
         newlst_obs = []
+        add_cur = newlst.append
+        add_obs = newlst_obs.append
         for msg in self._messages:
             if not msg.get("_remove_on_sync", False):
-                if not msg.obsolete:
-                    newlst.append(msg)
-                else:
-                    newlst_obs.append(msg)
+                (add_obs if msg.obsolete else add_cur)(msg)
         newlst.extend(newlst_obs)
+        # The sequence is monitored under "*", keep the nicer name aliased.
         self.__dict__["*"] = newlst
-        self._messages = self.__dict__["*"]
+        self._messages = newlst
 
         # Rebuild key-position links.
-        self._msgpos = {}
-        for i in range(len(self._messages)):
-            self._msgpos[self._messages[i].key] = i
+        self._rebuild_msgpos()
 
-        # Set inverse map to non-computed.
+        # Set inverse map and msgid index to non-computed.
         self._invmap = None
+        self._msgid_index = None
 
 
     def _make_invmap (self):
@@ -1344,14 +1621,75 @@ class Catalog (Monitored):
         # Map for inverse lookup (by translation) has as key the msgstr[0],
         # and the value the list of messages having the same msgstr[0].
 
-        self._invmap = {}
+        invmap = defaultdict(list)
         for msg in self._messages:
-            ikey = msg.msgstr[0]
-            msgs = self._invmap.get(ikey)
-            if msgs is None:
-                msgs = []
-                self._invmap[ikey] = msgs
-            msgs.append(msg)
+            invmap[msg.msgstr[0]].append(msg)
+        self._invmap = dict(invmap)
+
+
+    def _make_msgid_index (self):
+
+        # Index of messages by msgid, in catalog order.
+
+        msgid_index = {}
+        for msg in self._messages:
+            msgid_index.setdefault(msg.msgid, []).append(msg)
+        self._msgid_index = msgid_index
+
+
+    def _invmap_add (self, msg):
+
+        # Add message to inverse map, if the map has been computed.
+        if self._invmap is not None:
+            self._invmap.setdefault(msg.msgstr[0], []).append(msg)
+
+
+    def _invmap_remove (self, msg):
+
+        # Remove message from inverse map, if the map has been computed.
+        # If its msgstr[0] was modified since it was put into the map,
+        # it has to be looked for under all translations.
+        if self._invmap is not None:
+            msgs = self._invmap.get(msg.msgstr[0], [])
+            for i, omsg in enumerate(msgs):
+                if omsg is msg:
+                    msgs.pop(i)
+                    return
+            for msgs in self._invmap.values():
+                for i, omsg in enumerate(msgs):
+                    if omsg is msg:
+                        msgs.pop(i)
+                        return
+
+
+    def _rebuild_msgpos (self):
+
+        # Link keys to positions for all messages.
+        self._msgpos = {msg.key: i for i, msg in enumerate(self._messages)}
+        self._msgpos_stale = None
+
+
+    def _mark_msgpos_stale (self, pos):
+
+        # Key-position links from this position onwards may be wrong,
+        # due to insertion or removal of messages.
+        if self._msgpos_stale is None or pos < self._msgpos_stale:
+            self._msgpos_stale = pos
+
+
+    def _keypos (self, key):
+
+        # Position of the message by key, relinking stale positions
+        # if necessary. Raises KeyError if there is no such message.
+        pos = self._msgpos[key]
+        if self._msgpos_stale is not None and pos >= self._msgpos_stale:
+            msgpos = self._msgpos
+            messages = self._messages
+            for i in range(self._msgpos_stale, len(messages)):
+                msgpos[messages[i].key] = i
+            self._msgpos_stale = None
+            pos = msgpos[key]
+        return pos
 
 
     def insertion_inquiry (self, msg, srefsyn={}):
@@ -1375,6 +1713,8 @@ class Catalog (Monitored):
         """
 
         self._assert_headonly()
+        self._srcidx = None
+        self._obspos_ins = None
         return self._pick_insertion_point(msg, srefsyn)
 
 
@@ -1397,7 +1737,12 @@ class Catalog (Monitored):
         # Assume the existing messages in the catalog are properly ordered.
 
         if not msg.obsolete:
-            last = self.obspos()
+            # Messages are not modified during a single addition,
+            # so the position of first obsolete message is computed
+            # only once for all messages being added.
+            if self._obspos_ins is None:
+                self._obspos_ins = self.obspos()
+            last = self._obspos_ins
         else:
             last = len(self._messages)
 
@@ -1406,53 +1751,93 @@ class Catalog (Monitored):
         if not msg.source:
             return last, 0.0
 
-        ins_pos = -1
         # Try to find insertion position by comparing the source references
         # of the candidate the source references of the existing messages.
-        # The order of matching must be very specific for logical insertion.
         # If the matching source files are found, insert according to
         # the line number.
+        srcidx = self._srcidx
+        if srcidx is None or srcidx[0] != last or srcidx[1] is not srefsyn:
+            srcidx = (last, srefsyn, self._source_index(last, srefsyn))
+            self._srcidx = srcidx
+        stretches = srcidx[2]
         for src, lno in msg.source:
-            src_pos = 0
-            src_match = False
-            curr_prim_esrc = ""
-            for i in range(last):
-                emsg = self._messages[i]
-                if not emsg.source:
-                    continue
-                same_prim_esrc = False
-                for esrc, elno in emsg.source:
-                    if curr_prim_esrc in [esrc] + srefsyn.get(esrc, []):
-                        same_prim_esrc = True
-                        break
-                if not same_prim_esrc:
-                    curr_prim_esrc, elno = emsg.source[0]
-
-                if src in [curr_prim_esrc] + srefsyn.get(curr_prim_esrc, []):
-                    # The source file names match.
-                    # Insert at this position if the candidate's line
-                    # number preceeds that of the current message.
-                    src_match = True
-                    if lno < elno:
-                        ins_pos = i
-                        break
-                elif src_match:
-                    # The sources no longer match, but were matched
-                    # before. This means the candidate line number is
-                    # after all existing, so insert at this position.
-                    ins_pos = i
-                    break
-
-                if ins_pos >= 0:
+            stretch = stretches.get(src)
+            if stretch is None:
+                continue
+            elnos, eposs, end_pos, ordered = stretch
+            # Insert at the first position where the candidate's line
+            # number preceeds that of the existing message.
+            if ordered:
+                k = bisect_right(elnos, lno)
+            else:
+                k = 0
+                while k < len(elnos) and lno >= elnos[k]:
+                    k += 1
+            if k < len(elnos):
+                return eposs[k], 1.0
+            # The candidate line number is after all existing,
+            # so insert where the sources no longer match.
+            if end_pos is not None:
+                return end_pos, 1.0
+
+        return last, 0.0
+
+
+    def _source_index (self, last, srefsyn):
+
+        # Index the stretches of existing messages up to given position
+        # which share the source file, by each source file name.
+        # The order of matching must be very specific for logical insertion:
+        # a message stays within the current source file if any of its
+        # source references matches it, otherwise its first source
+        # reference starts a new current source file. The stretch for
+        # a source file name is the first contiguous run of messages
+        # whose current source file is that name or its synonym.
+        # Return dictionary of stretches as tuples of line numbers and
+        # positions of the messages in the stretch, the position of
+        # the first message after the stretch (or None if it reaches
+        # the end), and whether the line numbers are ordered.
+        # Sets of each source file name and its synonyms are composed
+        # once per name, rather than on every comparison.
+        synsets = {}
+        def synset (src):
+            names = synsets.get(src)
+            if names is None:
+                names = frozenset([src] + srefsyn.get(src, []))
+                synsets[src] = names
+            return names
+
+        stretches = {}
+        open_names = set()
+        curr_prim_esrc = ""
+        for i in range(last):
+            source = self._messages[i].source
+            if not source:
+                continue
+            same_prim_esrc = False
+            for esrc, elno in source:
+                if curr_prim_esrc in synset(esrc):
+                    same_prim_esrc = True
                     break
-
-            if ins_pos >= 0:
-                break
-
-        if ins_pos >= 0:
-            return ins_pos, 1.0
-        else:
-            return last, 0.0
+            if not same_prim_esrc:
+                curr_prim_esrc, elno = source[0]
+
+            names = synset(curr_prim_esrc)
+            for name in open_names - names:
+                stretches[name][2] = i
+            open_names &= names
+            for name in names:
+                if name not in stretches:
+                    stretches[name] = [[], [], None]
+                    open_names.add(name)
+                if name in open_names:
+                    stretch = stretches[name]
+                    stretch[0].append(elno)
+                    stretch[1].append(i)
+
+        return dict((name, (elnos, eposs, end_pos,
+                            all(x <= y for x, y in zip(elnos, elnos[1:]))))
+                    for name, (elnos, eposs, end_pos) in stretches.items())
 
 
     def nplurals (self):
@@ -1466,18 +1851,19 @@ class Catalog (Monitored):
         @rtype: int
         """
 
-        # Get nplurals string from the header.
-        plforms = self._header.get_field_value("Plural-Forms")
-        if not plforms: # no plural definition
-            return 1
-        nplustr = plforms.split(";")[0]
+        plforms, cache = self._plural_header()
+        nplurals = cache.get("nplurals")
+        if nplurals is None:
+            nplurals = 1
+            if plforms: # else no plural definition
+                # Get the number of forms from the nplurals string.
+                nplustr = plforms.split(";")[0]
+                m = _nplurals_rx.search(nplustr)
+                if m: # else malformed nplurals
+                    nplurals = int(m.group(0))
+            cache["nplurals"] = nplurals
 
-        # Get the number of forms from the string.
-        m = re.search(r"\d+", nplustr)
-        if not m: # malformed nplurals
-            return 1
-
-        return int(m.group(0))
+        return nplurals
 
 
     def plural_index (self, number):
@@ -1494,44 +1880,19 @@ class Catalog (Monitored):
         @rtype: int
         """
 
-        # Get plural definition from the header.
-        plforms = self._header.get_field_value("Plural-Forms")
+        plforms, cache = self._plural_header()
         if not plforms: # no plural definition, assume 0
             return 0
-        plustr = plforms.split(";")[1]
-
-        # Rebuild evaluation string only if changed to last invocation.
-        if plustr != self._plustr:
-            # Record raw plural definition for check on next call.
-            self._plustr = plustr
-
-            # Prepare Python-evaluable string out of the raw definition.
-            plustr = plustr[plustr.find("=") + 1:] # remove plural= part
-            p = -1
-            evalstr = ""
-            while 1:
-                p = plustr.find("?")
-                if p < 0:
-                    evalstr += " " + plustr
-                    break
-                cond = plustr[:p]
-                plustr = plustr[p + 1:]
-                cond = cond.replace("&&", " and ")
-                cond = cond.replace("||", " or ")
-                evalstr += "(" + cond + ") and "
-                p = plustr.find(":")
-                body = plustr[:p]
-                plustr = plustr[p + 1:]
-                evalstr += "\"" + body + "\" or "
-            if not evalstr.strip():
-                evalstr = "0"
-
-            # Record the current evaluable definition.
-            self._plustr_eval = evalstr
+
+        # Fetch evaluation function only if header changed since last time.
+        plural_fn = cache.get("plural_fn")
+        if plural_fn is None:
+            plustr = plforms.split(";")[1]
+            plural_fn = _plural_function(plustr)
+            cache["plural_fn"] = plural_fn
 
         # Evaluate the definition.
-        n = number # set eval context (plural definition uses n as variable)
-        form = int(eval(self._plustr_eval))
+        form = int(plural_fn(number))
 
         return form
 
@@ -1544,17 +1905,33 @@ class Catalog (Monitored):
         @rtype: [int*]
         """
 
-        # Get plural definition from the header.
-        plforms = self._header.get_field_value("Plural-Forms")
+        plforms, cache = self._plural_header()
         if not plforms: # no plural definition, assume 0
             return [0]
-        plustr = plforms.split(";")[1]
 
-        lst = re.findall(r"\bn\s*==\s*\d+\s*\)?\s*\?\s*(\d+)", plustr)
-        if not lst and re.search(r"\bn\s*(!=|>|<)\s*\d+\s*([^?]|$)", plustr):
-            lst = ["0"]
+        singles = cache.get("singles")
+        if singles is None:
+            plustr = plforms.split(";")[1]
+            lst = _plural_single_rx.findall(plustr)
+            if not lst and _plural_ineq_rx.search(plustr):
+                lst = ["0"]
+            singles = [int(x) for x in lst]
+            cache["singles"] = singles
+
+        return list(singles)
+
+
+    def _plural_header (self):
+
+        # Plural-Forms value and the cache of quantities derived from it.
+        # Header fields keep their value objects until set anew,
+        # so the cache is valid as long as the value is the same object.
+        plforms = self._header.get_field_value("Plural-Forms")
+        if plforms is not self._plural_header_cache_key:
+            self._plural_header_cache_key = plforms
+            self._plural_cache = {}
 
-        return [int(x) for x in lst]
+        return plforms, self._plural_cache
 
 
     def select_by_key (self, msgctxt, msgid, wobs=False):
@@ -1578,10 +1955,10 @@ class Catalog (Monitored):
         @rtype: [L{Message_base}*]
         """
 
-        m = MessageUnsafe({"msgctxt" : msgctxt, "msgid" : msgid})
-        p = self.find(m, wobs)
-        if p >= 0:
-            return [self._messages[p]]
+        self._assert_headonly()
+        key = MessageUnsafe.make_key(msgctxt, msgid)
+        if key in self._msgpos:
+            return [self._messages[self._keypos(key)]]
         else:
             return []
 
@@ -1624,12 +2001,12 @@ class Catalog (Monitored):
             rxflags |= re.I
         if not exctxt:
             if msgctxt is not None:
-                msgctxt_rx = re.compile(msgctxt, rxflags)
+                msgctxt_rx = _compile_rx(msgctxt, rxflags)
             else:
                 # Force exact match if actually no context required.
                 exctxt = True
         if not exid:
-            msgid_rx = re.compile(msgid, rxflags)
+            msgid_rx = _compile_rx(msgid, rxflags)
 
         selected_msgs = []
         for msg in self._messages:
@@ -1651,7 +2028,10 @@ class Catalog (Monitored):
         Several messages may have the same C{msgid} field, due to different
         C{msgctxt} fields. Empty list is returned when there is no match.
 
-        Runtime complexity O(n).
+        Runtime complexity O(n) for the first selection,
+        and then O(1) until messages are added, removed or replaced;
+        if msgid fields of some messages change in between,
+        this is not seen until next syncing (or L{sync_map}).
 
         @param msgid: the text of C{msgid} field
         @type msgid: string
@@ -1662,10 +2042,14 @@ class Catalog (Monitored):
         @rtype: [L{Message_base}*]
         """
 
-        selected_msgs = []
-        for msg in self._messages:
-            if (wobs or not msg.obsolete) and msg.msgid == msgid:
-                selected_msgs.append(msg)
+        if self._msgid_index is None:
+            self._make_msgid_index()
+
+        selected_msgs = self._msgid_index.get(msgid, [])
+        if not wobs:
+            selected_msgs = [x for x in selected_msgs if not x.obsolete]
+        else:
+            selected_msgs = list(selected_msgs)
 
         return selected_msgs
 
@@ -1681,6 +2065,8 @@ class Catalog (Monitored):
 
         Runtime complexity O(n) * O(length(msgid)*avg(length(msgids)))
         (probably).
+        Messages are looked up by msgid as in L{select_by_msgid},
+        so the same caveat applies to modifying msgid fields in between.
 
         @param msgid: the text of C{msgid} field
         @type msgid: string
@@ -1693,25 +2079,27 @@ class Catalog (Monitored):
         @rtype: [L{Message_base}*]
         """
 
-        # Build dictionary of message keys by msgid;
-        # there can be several keys per msgid, pack in a list.
-        msgkeys = {}
-        for msg in self._messages:
-            if msg.obsolete and not wobs:
-                # Skip obsolete messages if not explicitly included.
-                continue
-            if msg.msgid not in msgkeys:
-                msgkeys[msg.msgid] = []
-            msgkeys[msg.msgid].append(msg.key)
+        # Messages by msgid are taken from the msgid index,
+        # there can be several messages per msgid.
+        if self._msgid_index is None:
+            self._make_msgid_index()
+        msgid_index = self._msgid_index
+        if wobs:
+            msgids = msgid_index
+        else:
+            # Skip obsolete messages if not explicitly included.
+            msgids = [x for x, msgs in msgid_index.items()
+                      if any(not msg.obsolete for msg in msgs)]
 
         # Get near-match msgids.
-        near_msgids = difflib.get_close_matches(msgid, msgkeys, cutoff=cutoff)
+        near_msgids = difflib.get_close_matches(msgid, msgids, cutoff=cutoff)
 
         # Collect messages per selected msgids.
         selected_msgs = []
         for near_msgid in near_msgids:
-            for msgkey in msgkeys[near_msgid]:
-                selected_msgs.append(self._messages[self._msgpos[msgkey]])
+            for msg in msgid_index[near_msgid]:
+                if wobs or not msg.obsolete:
+                    selected_msgs.append(msg)
 
         return selected_msgs
 
@@ -1728,8 +2116,8 @@ class Catalog (Monitored):
         If C{lazy} is C{True}, complexity is O(n) for the first search,
         and then O(1) until next syncing of the catalog;
         if msgstr fields of some messages change in between,
-        or messages are added or removed from the catalog,
         this is not seen until next syncing.
+        Messages added to or removed from the catalog are seen immediately.
 
         @param msgstr0: the text of C{msgstr[0]} field
         @type msgstr0: string
@@ -1743,16 +2131,21 @@ class Catalog (Monitored):
         """
 
         if not lazy:
-            selected_msgs = {}
-            for msg in self._messages:
-                if (wobs or not msg.obsolete) and msg.msgstr[0] == msgstr0:
-                    selected_msgs.append(msg)
+            selected_msgs = [msg for msg in self._messages
+                             if (    msg.msgstr[0] == msgstr0
+                                 and (wobs or not msg.obsolete))]
         else:
             if self._invmap is None:
                 self._make_invmap()
-            selected_msgs = self._invmap.get(msgstr0, [])
-            if not wobs:
+            # Return a new list in any case, as lists in the map
+            # are kept current when messages are added or removed.
+            selected_msgs = self._invmap.get(msgstr0)
+            if not selected_msgs:
+                selected_msgs = []
+            elif not wobs:
                 selected_msgs = [x for x in selected_msgs if not x.obsolete]
+            else:
+                selected_msgs = list(selected_msgs)
 
         return selected_msgs
 
@@ -1793,6 +2186,20 @@ class Catalog (Monitored):
         self.header.set_field("Content-Type", ctval)
 
 
+    def _header_fields (self):
+
+        # Values of header fields by field name, in order of appearance,
+        # collected in one walk over the header for the current revision.
+        snap = self._header_snap
+        if snap is None or snap[0] != self._header._rev:
+            hfields = {}
+            for pair in self._header.field:
+                hfields.setdefault(pair.first, []).append(pair.second)
+            snap = (self._header._rev, hfields)
+            self._header_snap = snap
+        return snap[1]
+
+
     def accelerator (self):
         """
         Report characters used as accelerator markers in GUI messages.
@@ -1808,8 +2215,8 @@ class Catalog (Monitored):
         no accelerator markers in the catalog;
         if C{None}, that there is no determination about markers.
 
-        It is not defined when the header will be examined,
-        or if it will be reexamined when it changes.
+        The header is examined on first call, and reexamined after
+        it has been modified through its methods or attribute assignments.
         If you want to set accelerator markers after the catalog has been
         opened, use L{set_accelerator}.
 
@@ -1817,18 +2224,18 @@ class Catalog (Monitored):
         @rtype: set(string*) or C{None}
         """
 
-        if self._accels_determined:
+        if self._accels_rev is None or self._accels_rev == self._header._rev:
             return self._accels
 
         accels = None
-        self._accels_determined = True
+        self._accels_rev = self._header._rev
+        hfields = self._header_fields()
 
         for fname in (
             "Accelerator-Marker",
             "X-Accelerator-Marker",
         ):
-            fields = self._header.select_fields(fname)
-            for fname, fval in fields:
+            for fval in hfields.get(fname, ()):
                 if accels is None:
                     accels = set()
                 accels.update([x.strip() for x in fval.split(",")])
@@ -1860,7 +2267,7 @@ class Catalog (Monitored):
             self._accels.discard("")
         else:
             self._accels = None
-        self._accels_determined = True
+        self._accels_rev = None
 
 
     def markup (self):
@@ -1885,8 +2292,8 @@ class Catalog (Monitored):
         no markup in the catalog;
         if C{None}, that there is no determination about markup.
 
-        It is not defined when the header will be examined,
-        or if it will be reexamined when it changes.
+        The header is examined on first call, and reexamined after
+        it has been modified through its methods or attribute assignments.
         If you want to set markup types after the catalog has been
         opened, use L{set_markup} method.
 
@@ -1894,18 +2301,20 @@ class Catalog (Monitored):
         @rtype: set(string*) or C{None}
         """
 
-        if self._mtypes_determined:
+        if self._mtypes_rev is None or self._mtypes_rev == self._header._rev:
             return self._mtypes
 
         mtypes = None
-        self._mtypes_determined = True
+        self._mtypes_rev = self._header._rev
+        hfields = self._header_fields()
 
         for fname in (
             "Text-Markup",
             "X-Text-Markup",
         ):
-            fval = self._header.get_field_value(fname)
-            if fval is not None:
+            fvals = hfields.get(fname)
+            if fvals:
+                fval = fvals[0]
                 mtypes = set([x.strip().lower() for x in fval.split(",")])
                 mtypes.discard("")
 
@@ -1942,7 +2351,7 @@ class Catalog (Monitored):
             self._mtypes = set([x.lower() for x in mtypes])
         else:
             self._mtypes = None
-        self._mtypes_determined = True
+        self._mtypes_rev = None
 
 
     def language (self):
@@ -1956,8 +2365,8 @@ class Catalog (Monitored):
         If the field is not present, language is considered undetermined,
         and C{None} is returned.
 
-        It is not defined when the header will be examined,
-        or if it will be reexamined when it changes (most probably not).
+        The header is examined on first call, and reexamined after
+        it has been modified through its methods or attribute assignments.
         If you want to set language after the catalog has been
         opened, use L{set_language} method.
 
@@ -1965,15 +2374,15 @@ class Catalog (Monitored):
         @rtype: string or C{None}
         """
 
-        if self._lang_determined:
+        if self._lang_rev is None or self._lang_rev == self._header._rev:
             return self._lang
 
         lang = None
-        self._lang_determined = True
+        self._lang_rev = self._header._rev
 
-        fval = self._header.get_field_value("Language")
-        if fval:
-            lang = fval.strip()
+        fvals = self._header_fields().get("Language")
+        if fvals and fvals[0]:
+            lang = fvals[0].strip()
 
         self._lang = lang
         return lang
@@ -2000,7 +2409,7 @@ class Catalog (Monitored):
             self._lang = str(lang)
         else:
             self._lang = None
-        self._lang_determined = True
+        self._lang_rev = None
 
 
     def environment (self):
@@ -2042,8 +2451,8 @@ class Catalog (Monitored):
         It there is no environment header field, C{None} is reported.
         Empty list is reported if such field exists, but its value is empty.
 
-        It is not defined when the header will be examined,
-        or if it will be reexamined when it changes (most probably not).
+        The header is examined on first call, and reexamined after
+        it has been modified through its methods or attribute assignments.
         if you want to set environments after the catalog has been
         opened, use L{set_environment} method.
 
@@ -2051,21 +2460,22 @@ class Catalog (Monitored):
         @rtype: [string*] or C{None}
         """
 
-        if self._envs_determined:
+        if self._envs_rev is None or self._envs_rev == self._header._rev:
             return self._envs
 
         envs = None
-        self._envs_determined = True
+        self._envs_rev = self._header._rev
+        hfields = self._header_fields()
 
         for fname in (
             "Environment",
             "X-Environment",
         ):
-            fval = self._header.get_field_value(fname)
-            if fval is not None:
-                envs = [x.strip().lower() for x in fval.split(",")]
-                while "" in envs:
-                    envs.remove("")
+            fvals = hfields.get(fname)
+            if fvals:
+                fval = fvals[0]
+                envs = [x for x in (y.strip().lower()
+                                    for y in fval.split(",")) if x]
                 break
 
         self._envs = envs
@@ -2092,7 +2502,7 @@ class Catalog (Monitored):
             self._envs = set([x.lower() for x in envs])
         else:
             self._envs = None
-        self._envs_determined = True
+        self._envs_rev = None
 
 
     def wrapping (self):
@@ -2119,8 +2529,8 @@ class Catalog (Monitored):
         If several wrapping policy fields are present,
         it is undefined which one is taken into account.
 
-        It is not defined when the header will be examined,
-        or if it will be reexamined when it changes (most probably not).
+        The header is examined on first call, and reexamined after
+        it has been modified through its methods or attribute assignments.
         If you want to set wrapping after the catalog has been
         opened, use L{set_wrapping} method.
 
@@ -2128,18 +2538,20 @@ class Catalog (Monitored):
         @rtype: (string...) or C{None}
         """
 
-        if self._wrap_determined:
+        if self._wrap_rev is None or self._wrap_rev == self._header._rev:
             return self._wrapkw
 
         wrapkw = None
-        self._wrap_determined = True
+        self._wrap_rev = self._header._rev
+        hfields = self._header_fields()
 
         for fname in (
             "Wrapping",
             "X-Wrapping",
         ):
-            fval = self._header.get_field_value(fname)
-            if fval is not None:
+            fvals = hfields.get(fname)
+            if fvals:
+                fval = fvals[0]
                 wrapkw = [x.strip().lower() for x in fval.split(",")]
                 wrapkw = tuple(sorted(wrapkw))
                 break
@@ -2172,7 +2584,7 @@ class Catalog (Monitored):
 
         self._wrapkw = tuple(sorted(wrapkw)) if wrapkw is not None else None
         self._wrapf = select_field_wrapper(wrapkw)
-        self._wrap_determined = True
+        self._wrap_rev = None
 
 
     def wrapf (self):
@@ -2209,16 +2621,20 @@ class Catalog (Monitored):
         @rtype: [(string, [L{Message_base}])]
         """
 
+        # Dictionaries keep insertion order, i.e. sources by appearance.
+        # Source paths are interned as they are first seen, since they
+        # repeat over many messages and are often compared by clients.
         msgs_by_src = {}
-        sources = []
         for msg in self._messages:
-            src = msg.source and msg.source[0][0] or ""
-            if src not in msgs_by_src:
-                msgs_by_src[src] = []
-                sources.append(src)
-            msgs_by_src[src].append(msg)
+            source = msg.source
+            src = source[0][0] if source else ""
+            msgs = msgs_by_src.get(src)
+            if msgs is None:
+                msgs = []
+                msgs_by_src[intern(src)] = msgs
+            msgs.append(msg)
 
-        return [(x, msgs_by_src[x]) for x in sources]
+        return list(msgs_by_src.items())
 
 
     def sort_by_source (self):
@@ -2232,24 +2648,38 @@ class Catalog (Monitored):
         L{sync_map} is called at the end.
         """
 
+        # Same source files are referenced by many messages,
+        # so lowercase each file name only once.
+        lowered = {}
+        def srckey (s):
+            lsrc = lowered.get(s[0])
+            if lsrc is None:
+                lsrc = s[0].lower()
+                lowered[s[0]] = lsrc
+            return (lsrc, s[1])
+
         # Sort source references within messages.
+        # Set sources anew only when their order changed.
         for msg in self._messages:
-            sorted_source = sorted(msg.source,
-                                   key=lambda s: (s[0].lower(), s[1]))
+            source = msg.source
+            if len(source) < 2:
+                continue
+            sorted_source = sorted(source, key=srckey)
+            if all(s1 is s2 for s1, s2 in zip(source, sorted_source)):
+                continue
             if self._monitored:
                 msg.source = Monlist(list(map(Monpair, sorted_source)))
             else:
                 msg.source = sorted_source
 
+        # Sort messages by their first source reference,
+        # messages without source references coming first.
         sorted_messages = sorted(self._messages,
-                                 key=lambda m: [(s[0].lower(), s[1])
-                                                for s in m.source[:1]])
+                                 key=lambda m: (srckey(m.source[0])
+                                                if m.source else ()))
 
-        any_moved = False
-        for i in range(len(self._messages)):
-            if sorted_messages[i] is not self._messages[i]:
-                any_moved = True
-                break
+        any_moved = any(m1 is not m2 for m1, m2
+                        in zip(sorted_messages, self._messages))
         if any_moved:
             self._messages = sorted_messages
             self.sync_map()
@@ -2360,28 +2790,35 @@ class Catalog (Monitored):
             else:
                 tr_ident = "<%s>" % email
 
-            # Remove author placeholder.
-            for i in range(len(hdr.author)):
-                if "FIRST AUTHOR" in hdr.author[i]:
-                    hdr.author.pop(i)
+            # Look for author placeholder and for current author
+            # in the comments, in one pass.
+            plh_pos = None
+            cur_pos = None
+            for i, author in enumerate(hdr.author):
+                if plh_pos is None and "FIRST AUTHOR" in author:
+                    plh_pos = i
+                elif cur_pos is None and tr_ident in author:
+                    cur_pos = i
+                if plh_pos is not None and cur_pos is not None:
                     break
 
-            # Look for current author in the comments,
-            # to update only years if present.
+            # Remove author placeholder.
+            if plh_pos is not None:
+                hdr.author.pop(plh_pos)
+                if cur_pos is not None and cur_pos > plh_pos:
+                    cur_pos -= 1
+
+            # Update only years if current author is present.
             cyear = time.strftime("%Y")
             acfmt = "%s, %s."
-            new_author = True
-            for i in range(len(hdr.author)):
-                if tr_ident in hdr.author[i]:
-                    # Parse the current list of years.
-                    years = re.findall(r"\b(\d{2,4})\s*[,.]", hdr.author[i])
-                    if cyear not in years:
-                        years.append(cyear)
-                    years.sort()
-                    hdr.author[i] = acfmt % (tr_ident, ", ".join(years))
-                    new_author = False
-                    break
-            if new_author:
+            if cur_pos is not None:
+                # Parse the current list of years.
+                years = _author_years_rx.findall(hdr.author[cur_pos])
+                if cyear not in years:
+                    years.append(cyear)
+                years.sort()
+                hdr.author[cur_pos] = acfmt % (tr_ident, ", ".join(years))
+            else:
                 hdr.author.append(acfmt % (tr_ident, cyear))
 
             hdr.set_field("Last-Translator", str(tr_ident))
@@ -2469,10 +2906,7 @@ class Catalog (Monitored):
         renamings = {}
 
         # Collect all own sources, to avoid matching for them.
-        ownfs = set()
-        for msg in self._messages:
-            for src, lno in msg.source:
-                ownfs.add(src)
+        ownfs = set(src for msg in self._messages for src, lno in msg.source)
 
         if isinstance(cat, Catalog):
             cats = [cat]
@@ -2483,26 +2917,28 @@ class Catalog (Monitored):
             if self is ocat:
                 continue
 
-            fcnts = {}
-            ccnts = {}
+            fcnts = defaultdict(float)
+            ccnts = defaultdict(lambda: defaultdict(float))
             for msg in self._messages:
+                # Messages without sources contribute nothing,
+                # so do not bother looking them up in the other catalog.
+                if not msg.source:
+                    continue
                 omsg = ocat.get(msg)
                 if omsg is None:
                     continue
+                # Weigh each message disproportionally to the number of
+                # files it appears in (i.e. the sum of counts == 1).
+                fw = 1.0 / len(msg.source)
+                ow = 1.0 / len(omsg.source) if omsg.source else 0.0
+                # Other sources to count are the same for each own source.
+                osrcs = set(osrc for osrc, olno in omsg.source)
+                osrcs -= ownfs
                 for src, lno in msg.source:
-                    if src not in fcnts:
-                        fcnts[src] = 0.0
-                        ccnts[src] = {}
-                    # Weigh each message disproportionally to the number of
-                    # files it appears in (i.e. the sum of counts == 1).
-                    fcnts[src] += 1.0 / len(msg.source)
-                    counted = {}
-                    for osrc, olno in omsg.source:
-                        if osrc not in ownfs and osrc not in counted:
-                            if osrc not in ccnts[src]:
-                                ccnts[src][osrc] = 0.0
-                            ccnts[src][osrc] += 1.0 / len(omsg.source)
-                            counted[osrc] = True
+                    fcnts[src] += fw
+                    ccnts_src = ccnts[src]
+                    for osrc in osrcs:
+                        ccnts_src[osrc] += ow
 
             # Select match groups.
             fuzzies = {}
@@ -2520,12 +2956,11 @@ class Catalog (Monitored):
             for src, fuzzsrcs in sorted(fuzzies.items()):
                 group = [src] + fuzzsrcs
                 for src in group:
-                    if src not in renamings:
-                        renamings[src] = []
+                    srenamings = renamings.setdefault(src, [])
                     for osrc in group:
-                        if src != osrc and osrc not in renamings[src]:
-                            renamings[src].append(osrc)
-                    if not renamings[src]:
+                        if src != osrc and osrc not in srenamings:
+                            srenamings.append(osrc)
+                    if not srenamings:
                         renamings.pop(src)
 
         return renamings
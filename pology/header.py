@@ -13,6 +13,7 @@ from pology.monitored import Monitored, Monlist, Monpair
 from .message import Message
 
 import datetime
+import itertools
 import time
 import re
 
@@ -35,6 +36,11 @@ _Header_spec = {
     "key" : {"type" : bool, "derived" : True},
 }
 
+# Header revisions are drawn from a single counter,
+# so that they are unique between headers too.
+_header_revs = itertools.count()
+
+
 class Header (Monitored):
     """
     Header entry in PO catalogs.
@@ -84,6 +90,8 @@ class Header (Monitored):
         @type init: subclass of L{Message_base}, or L{Header}
         """
 
+        self._rev = next(_header_revs)
+
         if isinstance(init, Header): # copy header fields
             hdr = init
             self._title = Monlist(hdr._title)
@@ -197,6 +205,14 @@ class Header (Monitored):
             return Monitored.__getattr__(self, att)
 
 
+    def __setattr__ (self, att, val):
+
+        # New revision on assignment to any header part.
+        if att in _Header_spec:
+            self.__dict__["_rev"] = next(_header_revs)
+        Monitored.__setattr__(self, att, val)
+
+
     def get (self, att, default=None):
         """
         Get attribute value.
@@ -388,6 +404,7 @@ class Header (Monitored):
                 nfound += 1
                 if nfound - 1 == nth:
                     self.field[i] = Monpair((str(name), new_value))
+                    self._rev = next(_header_revs)
                     break
 
         return nfound - 1 == nth
@@ -445,6 +462,7 @@ class Header (Monitored):
                 ins_pos -= 1
             rpl_pos = -1
 
+        self._rev = next(_header_revs)
         pair = Monpair((name, value))
         if rpl_pos >= 0:
             self._field[rpl_pos] = pair
@@ -476,6 +494,7 @@ class Header (Monitored):
             if self.field[i][0] == name:
                 self.field.pop(i)
                 nrem += 1
+                self._rev = next(_header_revs)
             else:
                 i += 1
 
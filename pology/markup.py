@@ -1602,7 +1602,7 @@ def validate_html_l1 (text, ents=None):
         _html_l1 = collect_xml_spec_l1(specpath)
 
     if ents is not None:
-        ents = Multidict([ents, html_entities])
+        ents = Multidict([ents, html_entities]) if ents else html_entities
 
     xmlfmt = _("@item markup type", "HTML")
     return validate_xml_l1(text, spec=_html_l1, xmlfmt=xmlfmt, ents=ents,
@@ -1664,7 +1664,7 @@ def validate_qtrich_l1 (text, ents=None):
         _qtrich_l1 = collect_xml_spec_l1(specpath)
 
     if ents is not None:
-        ents = Multidict([ents, html_entities])
+        ents = Multidict([ents, html_entities]) if ents else html_entities
 
     xmlfmt = _("@item markup type", "Qt-rich")
     return validate_xml_l1(text, spec=_qtrich_l1, xmlfmt=xmlfmt, ents=ents,
@@ -1727,7 +1727,7 @@ def validate_kuit_l1 (text, ents=None):
         _kuit_l1 = collect_xml_spec_l1(specpath)
 
     if ents is not None:
-        ents = Multidict([ents, kuit_entities])
+        ents = Multidict([ents, kuit_entities]) if ents else kuit_entities
 
     xmlfmt = _("@item markup type", "KUIT")
     return validate_xml_l1(text, spec=_kuit_l1, xmlfmt=xmlfmt, ents=ents,
@@ -1768,7 +1768,7 @@ def validate_kde4_l1 (text, ents=None):
         _kde4_ents.update(kuit_entities)
 
     if ents is not None:
-        ents = Multidict([ents, _kde4_ents])
+        ents = Multidict([ents, _kde4_ents]) if ents else _kde4_ents
 
     xmlfmt = _("@item markup type", "KDE4")
     return validate_xml_l1(text, spec=_kde4_l1, xmlfmt=xmlfmt, ents=ents,
@@ -1825,7 +1825,7 @@ def validate_pango_l1 (text, ents=None):
         _pango_l1 = collect_xml_spec_l1(specpath)
 
     if ents is not None:
-        ents = Multidict([ents, html_entities])
+        ents = Multidict([ents, html_entities]) if ents else html_entities
 
     xmlfmt = _("@item markup type", "Pango")
     return validate_xml_l1(text, spec=_pango_l1, xmlfmt=xmlfmt, ents=ents,
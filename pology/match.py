@@ -436,19 +436,18 @@ def make_matcher (name, value, mods, params, neg=False):
 
     elif name == "msgstr":
         def matcher (msgf, msg, cat, hl=[]):
-            texts = [(msgf.msgstr[i], "msgstr", i)
-                     for i in range(len(msgf.msgstr))]
+            texts = [(x, "msgstr", i) for i, x in enumerate(msgf.msgstr)]
             return _rx_in_any_text(regex, texts, hl)
 
     elif name == "comment":
         def matcher (msgf, msg, cat, hl=[]):
             texts = []
-            texts.extend([(msgf.manual_comment[i], "manual_comment", i)
-                          for i in range(len(msgf.manual_comment))])
-            texts.extend([(msgf.auto_comment[i], "auto_comment", i)
-                          for i in range(len(msgf.auto_comment))])
-            texts.extend([(msgf.source[i][0], "source", i)
-                          for i in range(len(msgf.source))])
+            texts.extend([(x, "manual_comment", i)
+                          for i, x in enumerate(msgf.manual_comment)])
+            texts.extend([(x, "auto_comment", i)
+                          for i, x in enumerate(msgf.auto_comment)])
+            texts.extend([(x[0], "source", i)
+                          for i, x in enumerate(msgf.source)])
             return _rx_in_any_text(regex, texts, hl)
 
     elif name == "transl":
@@ -520,10 +519,11 @@ def make_matcher (name, value, mods, params, neg=False):
             return value in parse_summit_branches(msg)
 
     elif name == "flag":
+        search = regex.search
         def matcher (msgf, msg, cat, hl=[]):
             #FIXME: How to highlight flags? (then use _rx_in_any_text)
             for flag in msgf.flag:
-                if regex.search(flag):
+                if search(flag):
                     return True
             return False
 
@@ -540,9 +540,10 @@ def _rx_in_any_text (regex, texts, hl):
 
     match = False
     hl_dct = {}
+    finditer = regex.finditer
     for text, hl_name, hl_item in texts:
         # Go through all matches, to highlight them all.
-        for m in regex.finditer(text):
+        for m in finditer(text):
             hl_key = (hl_name, hl_item)
             if hl_key not in hl_dct:
                 hl_dct[hl_key] = ([], text)
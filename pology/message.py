@@ -333,7 +333,7 @@ class Message_base (object):
             return self.translated and not self.obsolete
 
         elif att == "key":
-            return self._compose(["msgctxt", "msgid"])
+            return self.make_key(self.msgctxt, self.msgid)
 
         elif att == "fmt":
             return self._compose(["msgctxt", "msgid",
@@ -392,6 +392,28 @@ class Message_base (object):
         return "\x04".join(fmtvals)
 
 
+    @staticmethod
+    def make_key (msgctxt, msgid):
+        """
+        Compose message key out of key-defining fields.
+
+        The key is the same as the C{key} attribute of the message
+        with these C{msgctxt} and C{msgid} fields.
+
+        @param msgctxt: the text of C{msgctxt} field
+        @type msgctxt: string or C{None}
+        @param msgid: the text of C{msgid} field
+        @type msgid: string
+
+        @returns: message key
+        @rtype: string
+        """
+
+        fctxt = msgctxt is None and "\x00" or "%s" % msgctxt
+        fid = msgid is None and "\x00" or "%s" % msgid
+        return fctxt + "\x04" + fid
+
+
     def get (self, att, default=None):
         """
         Get attribute value.
@@ -1022,6 +1044,45 @@ class MessageUnsafe (Message_base):
         # No need to look for line caches, as lines must always be reformatted.
 
 
+    @classmethod
+    def _adopt (cls, init):
+        """
+        Internal constructor, which takes over the dictionary of values.
+
+        Like the ordinary constructor, but instead of copying values,
+        the given dictionary itself becomes the instance dictionary.
+        Sequences must be fresh lists, which no one else refers to;
+        only missing values are filled in, and flags converted to a set.
+
+        @param init: dictionary of initial values
+        @type init: dict
+
+        @returns: the message
+        @rtype: L{MessageUnsafe}
+        """
+
+        msg = cls.__new__(cls)
+        object.__setattr__(msg, "__dict__", init)
+        init["^getsetattr"] = object
+        init["_colorize_prev"] = 0
+
+        for att in ("manual_comment", "auto_comment", "source"):
+            if att not in init:
+                init[att] = []
+        init["flag"] = set(init.get("flag", ()))
+        init.setdefault("obsolete", False)
+        for att in ("msgctxt_previous", "msgid_previous",
+                    "msgid_plural_previous", "msgctxt", "msgid_plural"):
+            init.setdefault(att, None)
+        init.setdefault("msgid", "")
+        if "msgstr" not in init:
+            init["msgstr"] = [""]
+        init.setdefault("refline", -1)
+        init.setdefault("refentry", -1)
+
+        return msg
+
+
     def _renew_lines (self, wrapf=wrap_field, force=False, colorize=0):
 
         # No monitoring, content must always be reformatted.
@@ -21,6 +21,10 @@ from pology.resolve import resolve_entities_simple
 
 def _rm_accel_in_msg (msg, accels, greedy=False):
 
+    # No markers and no guessing of them, fields would stay the same.
+    if not accels and not (accels is None and greedy):
+        return 0
+
     msg.msgid = _rm_accel_in_text(msg.msgid, accels, greedy)
     if msg.msgid_plural:
         msg.msgid_plural = _rm_accel_in_text(msg.msgid_plural, accels, greedy)
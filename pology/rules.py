@@ -17,11 +17,17 @@ See C{doc/user/lingo.docbook#sec-lgrules} for detailed discussion of rules.
 """
 
 from codecs import open
+from itertools import chain
 from locale import getlocale
 from os.path import dirname, basename, isdir, join, isabs
 from os import listdir
 import re
+try:
+    from re import _parser as sre_parse
+except ImportError: # Python < 3.11
+    import sre_parse
 import sys
+from sys import intern
 from time import time
 
 from pology import PologyError, datadir, _, n_
@@ -556,7 +562,7 @@ def _filterParseGeneral (fields):
         if name == "handle":
             handles = set([x.strip() for x in value.split(",")])
         elif name == "on":
-            parts = [x.strip() for x in value.split(",")]
+            parts = [intern(x.strip()) for x in value.split(",")]
             unknownParts = set(parts).difference(_filterKnownParts)
             if unknownParts:
                 raise _SyntaxError(
@@ -642,9 +648,10 @@ def _filterOnMsgstr (func):
 
     def aggregate (msg, cat):
 
-        for i in range(len(msg.msgstr)):
-            tmp = func(msg.msgstr[i], msg, cat)
-            if tmp is not None: msg.msgstr[i] = tmp
+        msgstr = msg.msgstr
+        for i, text in enumerate(msgstr):
+            tmp = func(text, msg, cat)
+            if tmp is not None: msgstr[i] = tmp
 
     return aggregate
 
@@ -666,9 +673,10 @@ def _filterOnMsgstrPure (func):
 
     def aggregate (msg, cat):
 
-        for i in range(len(msg.msgstr)):
-            tmp = func(msg.msgstr[i])
-            if tmp is not None: msg.msgstr[i] = tmp
+        msgstr = msg.msgstr
+        for i, text in enumerate(msgstr):
+            tmp = func(text)
+            if tmp is not None: msgstr[i] = tmp
 
     return aggregate
 
@@ -688,24 +696,24 @@ def _filterOnMsgidPure (func):
 
 def _ruleFilterSetOnParts (parts, func, sig):
 
-    chain = []
     parts = list(parts)
     parts.sort()
-    for part in parts:
-        if part == "pattern":
-            chain.append((_filterOnPattern(func), part))
+    # Pattern is the only rule part, so no dispatch by part is needed
+    # when the filter is applied.
+    patternFunc = None
+    if "pattern" in parts:
+        patternFunc = _filterOnPattern(func)
 
     def composition (value, part):
 
-        if part not in _filterKnownRuleParts:
+        if part != "pattern":
             raise PologyError(
                 _("@info",
                   "Unknown rule part '%(part)s' for the filter to act on.",
                   part=part))
 
-        for func, fpart in chain:
-            if fpart == part:
-                value = func(value)
+        if patternFunc is not None:
+            value = patternFunc(value)
 
         return value
 
@@ -720,6 +728,8 @@ def _ruleFilterComposeFinal (filterList):
         return None
 
     funcs = [x[2] for x in filterList]
+    if len(funcs) == 1:
+        return funcs[0]
 
     def composition (value, part):
 
@@ -768,12 +778,21 @@ def _filterCreateRegex (fields):
     return func, sig
 
 
+# Filter hooks with signatures already created, by hook specification.
+_filterHookCache = {}
+
 def _filterCreateHook (fields):
 
     _checkFields("addFilterHook", fields, ["name"], ["name"])
     fieldDict = dict(fields)
 
     hookSpec = fieldDict["name"]
+    # Same hooks are requested over and over in included filter files,
+    # and creating them means importing modules and evaluating factories.
+    hookSig = _filterHookCache.get(hookSpec)
+    if hookSig is not None:
+        return hookSig
+
     hook = get_hook_ireq(hookSpec, abort=False)
 
     sigSegs = []
@@ -784,7 +803,10 @@ def _filterCreateHook (fields):
             sigSegs.append("\x00")
     sig = "\x04".join(sigSegs)
 
-    return hook, sig
+    hookSig = (hook, sig)
+    _filterHookCache[hookSpec] = hookSig
+
+    return hookSig
 
 
 def _triggerParseGeneral (fields):
@@ -972,6 +994,13 @@ class Rule(object):
                       "%(msg)s",
                       pattern=pattern, msg=e))
             self.disabled=True
+        # Literal substring which any text must contain to be matched,
+        # for cheap rejection of texts before running the pattern.
+        self.literal, self.literalLower=None, False
+        if self.pattern is not None:
+            self.literalLower=bool(self.pattern.flags & re.I)
+            self.literal=_requiredLiteral(pattern, self.pattern.flags,
+                                          self.literalLower)
         self.rawPattern=pattern
         self.trigger=None # invalidate any trigger function
         if self.ident:
@@ -992,6 +1021,7 @@ class Rule(object):
         """
         self.trigger=trigger
         self.pattern=None # invalidate any pattern
+        self.literal, self.literalLower=None, False
         self.rawPattern=""
         if self.ident:
             self.displayName=_("@item:intext",
@@ -1034,13 +1064,14 @@ class Rule(object):
                         value=(re.compile(frx, self.reflags),
                                re.compile(vrx, self.reflags))
                     entry.append((key, value))
-                self.valid.append(entry)
+                self.valid.append(tuple(entry))
             except Exception as e:
                 warning(_("@info",
                           "Invalid validity definition '%(dfn)s', skipped. "
                           "The error was:\n%(msg)s",
                           dfn=item, msg=e))
                 continue
+        self.valid=tuple(self.valid)
 
     #@timed_out(TIMEOUT)
     def process (self, msg, cat, envs=set(), nofilter=False):
@@ -1087,8 +1118,10 @@ class Rule(object):
             begin=time()
 
         # Apply own filters to the message if not filtered already.
-        if not nofilter:
-            msg = self._filter_message(msg, cat, envs)
+        if not nofilter and self.mfilter is not None:
+            fmsg = MessageUnsafe(msg)
+            self.mfilter(fmsg, cat, envs)
+            msg = fmsg
 
         if self.pattern:
             failed_spans = self._processWithPattern(msg, cat, envs)
@@ -1140,16 +1173,26 @@ class Rule(object):
         text_spec = self._create_text_spec(self.msgpart, msg)
 
         failed_spans = {}
+        literal = self.literal
         for part, item, text in text_spec:
 
+            # Skip text without the literal required by the pattern.
+            if literal is not None:
+                if self.literalLower:
+                    if literal not in _lowerText(text):
+                        continue
+                elif literal not in text:
+                    continue
+
             # Get full data per match.
-            pmatches = list(self.pattern.finditer(text))
-            if not pmatches:
+            pmatches = self.pattern.finditer(text)
+            pmatch1 = next(pmatches, None)
+            if pmatch1 is None:
                 # Main pattern does not match anything, go to next text.
                 continue
 
             # Test all matched segments.
-            for pmatch in pmatches:
+            for pmatch in chain([pmatch1], pmatches):
                 # First validity entry that matches excepts the current segment.
                 cancel = False
                 for entry in self.valid:
@@ -1205,16 +1248,6 @@ class Rule(object):
         return list(failed_spans.values())
 
 
-    def _filter_message (self, msg, cat, envs):
-
-        fmsg = msg
-        if self.mfilter is not None:
-            fmsg = MessageUnsafe(msg)
-            self.mfilter(fmsg, cat, envs)
-
-        return fmsg
-
-
     def _is_valid (self, match, mstart, mend, text, ventry, msg, cat, envs):
 
         # All keys within a validity entry must match for the
@@ -1269,9 +1302,9 @@ class Rule(object):
 
             elif bkey == "after":
                 # Search up to the match to avoid need for lookaheads.
-                afterMatches = value.finditer(text, 0, mstart)
+                # Only non-overlapping matches count, as found by finditer.
                 found = False
-                for afterMatch in afterMatches:
+                for afterMatch in value.finditer(text, 0, mstart):
                     if afterMatch.end() == mstart:
                         found = True
                         break
@@ -1282,12 +1315,7 @@ class Rule(object):
 
             elif bkey == "before":
                 # Search from the match to avoid need for lookbehinds.
-                beforeMatches = value.finditer(text, mend)
-                found = False
-                for beforeMatch in beforeMatches:
-                    if beforeMatch.start() == mend:
-                        found = True
-                        break
+                found = value.match(text, mend) is not None
                 if invert: found = not found
                 if not found:
                     valid = False
@@ -1353,6 +1381,79 @@ class Rule(object):
         return valid
 
 
+# Characters which case-insensitive regex matching can equate only
+# to their own lowercase and uppercase forms.
+_caselessSafeChars = set(chr(c) for c in range(128)).difference("isIS")
+
+def _requiredLiteral (pattern, flags, caseless):
+    """
+    Find the longest literal substring which must appear in any text
+    matched by the pattern.
+
+    Only top-level literal runs are considered (including those in plain
+    groups and in repetitions of at least one).
+    In case-insensitive matching, the literal is returned in lowercase,
+    and only characters for which comparing lowercased strings is
+    equivalent to regex matching are taken into the literal.
+
+    @return: the literal, or C{None} if there is no usable literal
+    @rtype: string or C{None}
+    """
+
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+    except Exception:
+        return None
+
+    runs = []
+    def collect (items):
+        run = []
+        for op, av in items:
+            if op == sre_parse.LITERAL:
+                c = chr(av)
+                if not caseless or c in _caselessSafeChars:
+                    run.append(c)
+                    continue
+            runs.append(run)
+            run = []
+            if op == sre_parse.SUBPATTERN:
+                group, addFlags, delFlags, sub = av
+                if not addFlags and not delFlags:
+                    collect(sub)
+            elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT):
+                rmin, rmax, sub = av
+                if rmin >= 1:
+                    collect(sub)
+        runs.append(run)
+    collect(parsed)
+
+    literal = "".join(max(runs, key=len))
+    if not literal:
+        return None
+    if caseless:
+        literal = literal.lower()
+
+    return literal
+
+
+# Last text lowercased by _lowerText, with its lowercased version.
+_lowerTextCache = [None, None]
+
+def _lowerText (text):
+
+    # Consecutive rules usually check the same text objects.
+    if _lowerTextCache[0] is not text:
+        _lowerTextCache[:] = [text, text.lower()]
+    return _lowerTextCache[1]
+
+
+_ruleLineSpaceRx = re.compile(r"\s*")
+_ruleLineBracketRx = {"{": re.compile(r"[{}]"), "[": re.compile(r"[\[\]]")}
+_ruleLineKeywordRx = re.compile(r"\*\s*(\w*)")
+_ruleLineModifiersRx = re.compile(r"\S*")
+_ruleLineFieldRx = re.compile(r"[^\s=]*")
+_ruleLineFieldNameRx = re.compile(r"^!?[a-z][\w-]*$")
+
 def _parseRuleLine (lines, lno):
     """
     Split a rule line into fields as list of (name, value) pairs.
@@ -1380,11 +1481,9 @@ def _parseRuleLine (lines, lno):
     p = 0
     in_modifiers = False
 
-    while p < llen:
-        while line[p].isspace():
-            p += 1
-            if p >= llen:
-                break
+    # Each step consumes a whole token, scanned by one of the regexes.
+    while True:
+        p = _ruleLineSpaceRx.match(line, p).end()
         if p >= llen or line[p] == "#":
             break
 
@@ -1398,14 +1497,14 @@ def _parseRuleLine (lines, lno):
             # Look for the balanced closing bracket.
             p1 = p + 1
             balance = 1
-            while balance > 0:
-                p += 1
-                if p >= llen:
-                    break
-                if line[p] == bropn:
+            for m in _ruleLineBracketRx[bropn].finditer(line, p1):
+                if m.group() == bropn:
                     balance += 1
-                elif line[p] == brcls:
+                else:
                     balance -= 1
+                    if balance == 0:
+                        p = m.start()
+                        break
             if balance > 0:
                 raise _SyntaxError(
                     _("@info",
@@ -1419,36 +1518,30 @@ def _parseRuleLine (lines, lno):
 
         elif len(fields) == 0 and line[p] == _rule_start:
             # Verbose trigger.
-            p += 1
-            while p < llen and line[p].isspace():
-                p += 1
-            if p >= llen:
+            m = _ruleLineKeywordRx.match(line, p)
+            if m.start(1) >= llen:
                 raise _SyntaxError(
                     _("@info",
                       "Missing '%(kw)s' keyword in the rule trigger.",
                       kw="match"))
 
             # Collect the match keyword.
-            p1 = p
-            while line[p].isalnum() or line[p] == "_":
-                p += 1
-                if p >= llen:
-                    raise _SyntaxError(
-                        _("@info",
-                          "Malformed rule trigger."))
-            tkeyw = line[p1:p]
+            p = m.end()
+            if p >= llen:
+                raise _SyntaxError(
+                    _("@info",
+                      "Malformed rule trigger."))
+            tkeyw = intern(m.group(1))
             fields.append((_rule_start, tkeyw))
 
             if tkeyw in _trigger_msgparts:
                 # Collect the pattern.
-                while line[p].isspace():
-                    p += 1
-                    if p >= llen:
-                        raise _SyntaxError(
-                            _("@info",
-                              "No pattern after the trigger keyword '%(kw)s'.",
-                              kw=tkeyw))
-                quote = line[p]
+                p = _ruleLineSpaceRx.match(line, p).end()
+                if p >= llen:
+                    raise _SyntaxError(
+                        _("@info",
+                          "No pattern after the trigger keyword '%(kw)s'.",
+                          kw=tkeyw))
                 p1 = p + 1
                 p = _findEndQuote(line, p)
                 fields.append((line[p1:p], ""))
@@ -1461,10 +1554,7 @@ def _parseRuleLine (lines, lno):
         elif in_modifiers:
             # Modifiers after the trigger pattern.
             p1 = p
-            while not line[p].isspace():
-                p += 1
-                if p >= llen:
-                    break
+            p = _ruleLineModifiersRx.match(line, p).end()
             pattern, pmods = fields[-1]
             fields[-1] = (pattern, pmods + line[p1:p])
 
@@ -1473,12 +1563,10 @@ def _parseRuleLine (lines, lno):
 
             # Collect field name.
             p1 = p
-            while not line[p].isspace() and line[p] != "=":
-                p += 1
-                if p >= llen:
-                    break
-            fname = line[p1:p]
-            if not re.match(r"^!?[a-z][\w-]*$", fname):
+            p = _ruleLineFieldRx.match(line, p).end()
+            # Interned, as field names are compared a lot later on.
+            fname = intern(line[p1:p])
+            if not _ruleLineFieldNameRx.match(fname):
                 raise _SyntaxError(
                     _("@info",
                       "Invalid field name '%(field)s'.",
@@ -1492,7 +1580,6 @@ def _parseRuleLine (lines, lno):
                 if p >= llen or line[p].isspace():
                     fields.append((fname, ""))
                 else:
-                    quote = line[p]
                     p1 = p + 1
                     p = _findEndQuote(line, p)
                     fvalue = line[p1:p]
@@ -1502,6 +1589,10 @@ def _parseRuleLine (lines, lno):
     return fields, lno
 
 
+# Regexes matching quoted strings up to and including the closing quote,
+# by quote character.
+_endQuoteRxs = {}
+
 def _findEndQuote (line, pos=0):
     """
     Find end quote to the quote at given position in the line.
@@ -1521,29 +1612,19 @@ def _findEndQuote (line, pos=0):
     """
 
     quote = line[pos]
-    epos = pos + 1
-
-    llen = len(line)
-    string = ""
-    while epos < llen:
-        c = line[epos]
-        if c == "\\":
-            epos += 1
-            c2 = line[epos]
-            if c2 != quote:
-                string += c
-            string += c2
-        elif c == quote:
-            break
-        else:
-            string += c
-        epos += 1
-
-    if epos == llen:
+    m = None
+    if quote != "\\": # backslash quote can never be closed
+        rx = _endQuoteRxs.get(quote)
+        if rx is None:
+            q = re.escape(quote)
+            rx = re.compile(r"(?:\\.|[^\\%s])*%s" % (q, q), re.S)
+            _endQuoteRxs[quote] = rx
+        m = rx.match(line, pos + 1)
+
+    if m is None:
         raise _SyntaxError(
             _("@info",
               "Non-terminated quoted string '%(snippet)s'.",
               snippet=line[pos:]))
 
-    return epos
-
+    return m.end() - 1
@@ -66,6 +66,10 @@ def parse_sieve_flags (msg):
     @rtype: set of strings
     """
 
+    # Most messages have no manual comments to parse.
+    if not msg.manual_comment:
+        return set()
+
     return set(manc_parse_flag_list(msg, "|"))
 
 
@@ -9,6 +9,9 @@ Documented in C{doc/user/sieving.docbook}.
 @license: GPLv3
 """
 
+from functools import lru_cache
+import re
+
 from pology import _, n_
 from pology.markup import flag_no_check_markup
 from pology.markup import validate_kde4_l1
@@ -61,17 +64,21 @@ class Sieve (object):
         # In in non-strict mode, check XML of translation only if the
         # original itself is valid XML.
         if not self.strict:
-            if (   validate_kde4_l1(msg.msgid, ents={})
-                or validate_kde4_l1(msg.msgid_plural or "", ents={})
-            ):
+            if _original_invalid(msg.msgid):
+                return
+            if msg.msgid_plural and _original_invalid(msg.msgid_plural):
                 return
 
-        highlight = []
-        for i in range(len(msg.msgstr)):
-            spans = validate_kde4_l1(msg.msgstr[i], ents={})
+        highlight = None
+        for i, msgstr in enumerate(msg.msgstr):
+            if not _markup_rx.search(msgstr):
+                continue
+            spans = validate_kde4_l1(msgstr, ents={})
             if spans:
                 self.nproblems += 1
-                highlight.append(("msgstr", i, spans, msg.msgstr[i]))
+                if highlight is None:
+                    highlight = []
+                highlight.append(("msgstr", i, spans, msgstr))
 
         if highlight:
             report_on_msg_hl(highlight, msg, cat)
@@ -96,3 +103,23 @@ class Sieve (object):
                          num=self.nproblems)
             report("===== " + msg)
 
+
+# Text without any of these cannot have invalid markup:
+# tags, entities and CDATA ends, and characters not allowed in XML
+# (or not encodable at all, like lone surrogates).
+_markup_rx = re.compile(r"[<&\x00-\x08\x0b\x0c\x0e-\x1f"
+                        r"\ud800-\udfff\ufffe\uffff]|\]\]>")
+
+
+def _original_invalid (text):
+
+    return bool(_markup_rx.search(text)) and _original_invalid_cached(text)
+
+
+# Originals repeat a lot across catalogs, so remember for each
+# whether its markup is valid instead of parsing it again.
+@lru_cache(maxsize=4096)
+def _original_invalid_cached (text):
+
+    return bool(validate_kde4_l1(text, ents={}))
+
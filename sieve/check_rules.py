@@ -358,16 +358,11 @@ class Sieve (object):
         # is not defined, but this is not generally possible because
         # different rule files may be loaded for different runs.
 
-        # Prepare filtered messages for checking.
+        # Filtered messages for checking, created on first use
+        # by a rule which is applied to this message.
+        # Rules with same filters share filter functions.
         envSet = set(self.envs)
-        msgByFilter = {}
-        for mfilter in self.ruleFilters:
-            if mfilter is not None:
-                msgf = MessageUnsafe(msg)
-                mfilter(msgf, cat, envSet)
-            else:
-                msgf = msg
-            msgByFilter[mfilter] = msgf
+        msgByFilter = {None: msg}
 
         # Now the sieve itself. Check message with every rules
         failedRules = []
@@ -380,7 +375,11 @@ class Sieve (object):
                 continue
             if rule.manual and not rule.ident in locally_applied:
                 continue
-            msgf = msgByFilter[rule.mfilter]
+            msgf = msgByFilter.get(rule.mfilter)
+            if msgf is None:
+                msgf = MessageUnsafe(msg)
+                rule.mfilter(msgf, cat, envSet)
+                msgByFilter[rule.mfilter] = msgf
             try:
                 spans = rule.process(msgf, cat, envs=envSet, nofilter=True)
             except TimedOutException:
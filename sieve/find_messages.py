@@ -26,7 +26,6 @@ from pology.msgreport import report_msg_to_lokalize
 from pology.report import report, error, warning, format_item_list
 from pology.sieve import SieveError
 from pology.sieve import add_param_poeditors
-from functools import reduce
 
 
 def setup_sieve (p):
@@ -269,6 +268,8 @@ def setup_sieve (p):
 
 _flag_mark = "match"
 
+_text_fields = ["msgctxt", "msgid", "msgstr", "comment"]
+
 
 class Sieve (object):
 
@@ -309,13 +310,14 @@ class Sieve (object):
                         raise SieveError(str_to_unicode(str(e)))
                     matchers.append(m)
 
-            if orlinked:
-                expr = lambda *a: reduce(lambda s, m: s or m(*a),
-                                         matchers, False)
+            if not matchers:
+                return lambda *a: not orlinked
+            elif len(matchers) == 1:
+                return matchers[0]
+            elif orlinked:
+                return lambda *a: any(m(*a) for m in matchers)
             else:
-                expr = lambda *a: reduce(lambda s, m: s and m(*a),
-                                         matchers, True)
-            return expr
+                return lambda *a: all(m(*a) for m in matchers)
 
         # - first matchers which are always AND
         expr_and = make_match_group([
@@ -332,6 +334,35 @@ class Sieve (object):
         # - all together
         self.matcher = lambda *a: expr_and(*a) and expr_andor(*a)
 
+        # In OR-relation of plain text patterns, a message can be rejected
+        # by a single search of all patterns joined into one alternation.
+        # Patterns with groups or inline flags are not joined, since
+        # the joining could change what they match.
+        self.prefilter = None
+        self.prefilter_fields = []
+        if (    self.p.or_match
+            and self.p.fexpr is None and self.p.nfexpr is None
+            and not any(getattr(self.p, "n" + x) for x in _text_fields)
+        ):
+            rxstrs = []
+            for field in _text_fields:
+                values = getattr(self.p, field)
+                if values:
+                    self.prefilter_fields.append(field)
+                    rxstrs.extend(values)
+            rxflags = re.U
+            if not self.p.case:
+                rxflags |= re.I
+            try:
+                if (    len(rxstrs) > 1
+                    and not any("(?" in x or re.compile(x, rxflags).groups
+                                for x in rxstrs)
+                ):
+                    self.prefilter = re.compile(
+                        "(?:" + ")|(?:".join(rxstrs) + ")", rxflags).search
+            except re.error:
+                pass
+
         # Prepare replacement.
         self.replrxs = []
         if self.p.replace is not None:
@@ -371,11 +402,21 @@ class Sieve (object):
         """
 
         # Prepare filtered message for matching.
-        msgf = make_filtered_msg(msg, cat, filters=self.pfilters)
+        # Without filters and accelerator markers (which can also be given
+        # in manual comments), the message itself would come out.
+        if self.pfilters or msg.manual_comment or cat.accelerator():
+            msgf = make_filtered_msg(msg, cat, filters=self.pfilters)
+        else:
+            msgf = msg
 
         # Match the message.
         hl_spec = []
-        match = self.matcher(msgf, msg, cat, hl_spec)
+        if (    self.prefilter is not None
+            and not _search_fields(self.prefilter, self.prefilter_fields, msgf)
+        ):
+            match = False
+        else:
+            match = self.matcher(msgf, msg, cat, hl_spec)
         if self.p.invert:
             match = not match
 
@@ -417,3 +458,27 @@ class Sieve (object):
                      num=self.nmatch)
             report("===== " + msg)
 
+
+def _search_fields (search, fields, msg):
+
+    texts = []
+    for field in fields:
+        if field == "msgctxt":
+            if msg.msgctxt is not None:
+                texts.append(msg.msgctxt)
+        elif field == "msgid":
+            texts.append(msg.msgid)
+            if msg.msgid_plural is not None:
+                texts.append(msg.msgid_plural)
+        elif field == "msgstr":
+            texts.extend(msg.msgstr)
+        elif field == "comment":
+            texts.extend(msg.manual_comment)
+            texts.extend(msg.auto_comment)
+            texts.extend([x[0] for x in msg.source])
+
+    for text in texts:
+        if search(text):
+            return True
+    return False
+
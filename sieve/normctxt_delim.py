@@ -56,17 +56,14 @@ class Sieve (object):
         if msg.msgctxt or msg.msgctxt_previous:
             return
 
-        msrc = (cat.filename, msg.refline, msg.refentry)
-
         if msg.msgid.startswith(self.chead):
-            pos = msg.msgid.find(self.ctail)
-            if pos < 0:
+            head, found, text = msg.msgid.partition(self.ctail)
+            if not found:
                 warning_on_msg(_("@info",
                                  "Malformed embedded context."), msg, cat)
                 return
 
-            ctxt = msg.msgid[len(self.chead):pos]
-            text = msg.msgid[pos + len(self.ctail):]
+            ctxt = head[len(self.chead):]
 
             if not ctxt or not text:
                 warning_on_msg(_("@info", "Empty context or text."), msg, cat)
@@ -47,13 +47,14 @@ class Sieve (object):
         if msg.msgctxt or msg.msgctxt_previous:
             return
 
-        pos = msg.msgid.find(self.csep)
-        if pos >= 0:
-            if msg.msgid.find(self.csep, pos + len(self.csep)) >= 0:
-                # If more than one delimiter, probably not context.
-                return
-            ctxt = msg.msgid[:pos]
-            text = msg.msgid[pos + len(self.csep):]
+        # Most messages have no separator at all.
+        if self.csep not in msg.msgid:
+            return
+
+        parts = msg.msgid.split(self.csep, 2)
+        if len(parts) == 2:
+            # (If more than one delimiter, probably not context.)
+            ctxt, text = parts
             if not ctxt or not text:
                 # Something is strange, skip.
                 return
@@ -1,5 +1,7 @@
 import os
 
+import pytest
+
 from pology.catalog import Catalog
 from pology.message import Message
 
@@ -22,3 +24,133 @@ def test_template_load():
         })
     ]
     assert actual == expected
+
+
+CATALOG_HEADER = """\
+msgid ""
+msgstr ""
+"Project-Id-Version: Pology\\n"
+"MIME-Version: 1.0\\n"
+"Content-Type: text/plain; charset=utf-8\\n"
+"Content-Transfer-Encoding: 8bit\\n"
+"Plural-Forms: nplurals=2; plural=(n != 1);\\n"
+"""
+
+
+def make_catalog(tmp_path, entries):
+    """Write a catalog from (source refs, msgid, msgstr) entries and open it."""
+    chunks = [CATALOG_HEADER]
+    for sources, msgid, msgstr in entries:
+        chunks.append(
+            '#: %s\nmsgid "%s"\nmsgstr "%s"\n' % (sources, msgid, msgstr))
+    path = tmp_path / "test.po"
+    path.write_text("\n".join(chunks), encoding="utf-8")
+    return Catalog(str(path))
+
+
+def test_setitem_updates_lazy_msgstr_selection(tmp_path):
+    catalog = make_catalog(tmp_path, [
+        ("a.cpp:1", "one", "jedan"),
+        ("a.cpp:1", "two", "dva"),
+    ])
+    assert catalog.select_by_msgstr("jedan", lazy=True) == [catalog[0]]
+
+    message = Message(catalog[0])
+    message.msgstr[0] = "prvi"
+    catalog[message] = message
+    assert catalog.select_by_msgstr("jedan", lazy=True) == []
+    assert catalog.select_by_msgstr("prvi", lazy=True) == [message]
+
+    catalog[1].msgstr[0] = "drugi"
+    catalog[1] = catalog[1]
+    assert catalog.select_by_msgstr("dva", lazy=True) == []
+    assert catalog.select_by_msgstr("drugi", lazy=True) == [catalog[1]]
+
+
+def test_select_by_msgstr(tmp_path):
+    catalog = make_catalog(tmp_path, [
+        ("a.cpp:1", "one", "isto"),
+        ("a.cpp:1", "two", "drugo"),
+        ("a.cpp:1", "three", "isto"),
+    ])
+    catalog[2].obsolete = True
+    assert catalog.select_by_msgstr("isto") == [catalog[0]]
+    assert catalog.select_by_msgstr("isto", wobs=True) == [
+        catalog[0], catalog[2]]
+    assert catalog.select_by_msgstr("none") == []
+
+
+def test_add_more_automatic_positions(tmp_path):
+    catalog = make_catalog(tmp_path, [
+        ("a.cpp:1", "one", "jedan"),
+        ("b.cpp:1", "two", "dva"),
+        ("c.cpp:1", "five", "pet"),
+    ])
+    messages = [
+        Message({"msgid": "three", "msgstr": ["tri"],
+                 "source": [("a.cpp", 5)]}),
+        Message({"msgid": "four", "msgstr": ["cetiri"],
+                 "source": [("b.cpp", 5)]}),
+    ]
+    positions = catalog.add_more([(msg, None) for msg in messages])
+    assert positions == [1, 3]
+    assert [msg.msgid for msg in catalog] == [
+        "one", "three", "two", "four", "five"]
+    assert [catalog.find(msg) for msg in catalog] == list(range(5))
+
+
+def test_add_more_mixed_positions(tmp_path):
+    catalog = make_catalog(tmp_path, [
+        ("a.cpp:1", "one", "jedan"),
+        ("b.cpp:1", "two", "dva"),
+        ("c.cpp:1", "five", "pet"),
+    ])
+    messages = [
+        Message({"msgid": "new%d" % i, "msgstr": ["novo"],
+                 "source": [("b.cpp", 9)]})
+        for i in range(3)
+    ]
+    positions = catalog.add_more(
+        [(messages[0], 0), (messages[1], None), (messages[2], 2)])
+    assert positions == [0, 4, 3]
+    assert [msg.msgid for msg in catalog] == [
+        "new0", "one", "two", "new2", "new1", "five"]
+    assert [catalog.find(msg) for msg in catalog] == list(range(6))
+
+
+@pytest.mark.parametrize(
+    "positions,expected_positions,expected_msgids",
+    (
+        ([1, 1, -1], [1, 1, 2], ["one", "new1", "new2", "new0", "two", "five"]),
+        ([3, 3, 3], [3, 3, 3], ["one", "two", "five", "new2", "new1", "new0"]),
+    ),
+)
+def test_add_more_cumulative_positions(
+        tmp_path, positions, expected_positions, expected_msgids):
+    catalog = make_catalog(tmp_path, [
+        ("a.cpp:1", "one", "jedan"),
+        ("b.cpp:1", "two", "dva"),
+        ("c.cpp:1", "five", "pet"),
+    ])
+    messages = [
+        Message({"msgid": "new%d" % i, "msgstr": ["novo"]})
+        for i in range(len(positions))
+    ]
+    result = catalog.add_more(list(zip(messages, positions)), cumulative=True)
+    assert result == expected_positions
+    assert [msg.msgid for msg in catalog] == expected_msgids
+    assert [catalog.find(msg) for msg in catalog] == list(range(6))
+
+
+def test_sort_by_source(tmp_path):
+    catalog = make_catalog(tmp_path, [
+        ("c.cpp:4", "one", "jedan"),
+        ("B.cpp:7 a.cpp:9", "two", "dva"),
+        ("b.cpp:2", "three", "tri"),
+        ("c.cpp:1", "four", "cetiri"),
+    ])
+    catalog.sort_by_source()
+    assert [msg.msgid for msg in catalog] == ["two", "three", "four", "one"]
+    assert [list(source) for source in catalog[0].source] == [
+        ["a.cpp", 9], ["B.cpp", 7]]
+    assert [catalog.find(msg) for msg in catalog] == list(range(4))
@@ -0,0 +1,22 @@
+import pytest
+
+from pology.message import MessageUnsafe
+from pology.rules import Rule
+
+
+@pytest.mark.parametrize(
+    "msgid,excepted",
+    (
+        ("aab", True),
+        ("xaab", True),
+        ("ab", False),
+        # "aa" preceding the match overlaps the earlier "aa" at the start,
+        # so it does not count.
+        ("aaab", False),
+        ("aaaab", True),
+    ),
+)
+def test_after_validity(msgid, excepted):
+    rule = Rule("b", "msgid", valid=[[("after", "aa")]])
+    spans = rule.process(MessageUnsafe({"msgid": msgid}), None)
+    assert (not spans) == excepted